@@ -0,0 +1,37 @@
+"""64-bit ticket ids and id block counters for sharding
+
+Revision ID: 0b6d9e3f5a21
+Revises: f7a3d1c84e25
+Create Date: 2026-10-18 13:41:09.217563
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b6d9e3f5a21'
+down_revision: Union[str, None] = 'f7a3d1c84e25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TICKET_ID_COLUMNS = [('tickets', 'id'), ('audit_logs', 'ticket_id'), ('ticket_snapshots', 'ticket_id')]
+
+def upgrade() -> None:
+    # SQLite integers are already 64-bit and must stay INTEGER for rowid autoincrement
+    if op.get_bind().dialect.name != 'sqlite':
+        for table, column in TICKET_ID_COLUMNS:
+            op.alter_column(table, column, existing_type=sa.Integer(), type_=sa.BigInteger())
+    op.create_table('id_blocks',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('next_block', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+def downgrade() -> None:
+    op.drop_table('id_blocks')
+    if op.get_bind().dialect.name != 'sqlite':
+        for table, column in TICKET_ID_COLUMNS:
+            op.alter_column(table, column, existing_type=sa.BigInteger(), type_=sa.Integer())
@@ -0,0 +1,102 @@
+"""MinHash/LSH index for near-duplicate tickets
+
+Revision ID: 3d8f2a6c1b90
+Revises: 0b6d9e3f5a21
+Create Date: 2026-10-18 15:02:36.514207
+
+"""
+import hashlib
+import random
+import re
+from typing import List, Optional, Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d8f2a6c1b90'
+down_revision: Union[str, None] = '0b6d9e3f5a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TicketId = sa.BigInteger().with_variant(sa.Integer(), 'sqlite')
+BACKFILL_BATCH_SIZE = 1000
+
+# Frozen copy of the MinHash/LSH scheme of app.core.similarity at this revision, so the
+# migration neither imports the app (config, models, shard engines) nor changes with it
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // LSH_BANDS
+_PRIME = (1 << 31) - 1
+_rng = random.Random(0x5EED)
+_A = np.array([_rng.randrange(1, _PRIME) for _ in range(NUM_PERMUTATIONS)], dtype=np.uint64)
+_B = np.array([_rng.randrange(0, _PRIME) for _ in range(NUM_PERMUTATIONS)], dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    words = set(_WORD.findall(text.casefold()))
+    if not words:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "big") for word in words),
+        dtype=np.uint64,
+        count=len(words),
+    )
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1).astype("<u4")
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        digest = hashlib.blake2b(bytes([band]) + rows, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big") >> 1)
+    return keys
+
+def upgrade() -> None:
+    op.add_column('tickets', sa.Column('duplicate_of', TicketId, nullable=True))
+    op.create_index(op.f('ix_tickets_duplicate_of'), 'tickets', ['duplicate_of'], unique=False)
+    signatures = op.create_table('ticket_signatures',
+    sa.Column('ticket_id', TicketId, nullable=False),
+    sa.Column('signature', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ticket_id')
+    )
+    buckets = op.create_table('ticket_lsh_buckets',
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.Column('ticket_id', TicketId, nullable=False),
+    sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('bucket', 'ticket_id')
+    )
+
+    # Index existing tickets so they can be found as similar; only new tickets get duplicate_of
+    bind = op.get_bind()
+    tickets = sa.table('tickets', sa.column('id'), sa.column('source_query'))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(tickets.c.id, tickets.c.source_query)
+            .where(tickets.c.id > last_id)
+            .order_by(tickets.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        signature_rows, bucket_rows = [], []
+        for ticket_id, source_query in rows:
+            signature = minhash_signature(source_query)
+            if signature is None:
+                continue
+            signature_rows.append({'ticket_id': ticket_id, 'signature': signature.tobytes()})
+            bucket_rows.extend({'bucket': key, 'ticket_id': ticket_id} for key in band_keys(signature))
+        if signature_rows:
+            bind.execute(signatures.insert(), signature_rows)
+            bind.execute(buckets.insert(), bucket_rows)
+        last_id = rows[-1][0]
+
+def downgrade() -> None:
+    op.drop_table('ticket_lsh_buckets')
+    op.drop_table('ticket_signatures')
+    op.drop_index(op.f('ix_tickets_duplicate_of'), table_name='tickets')
+    op.drop_column('tickets', 'duplicate_of')
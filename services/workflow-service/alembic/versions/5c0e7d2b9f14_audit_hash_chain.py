@@ -0,0 +1,38 @@
+"""Audit hash chain
+
+Revision ID: 5c0e7d2b9f14
+Revises: a31ebcb622a7
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c0e7d2b9f14'
+down_revision: Union[str, None] = 'a31ebcb622a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.add_column('tickets', sa.Column('audit_hash', sa.String(length=64), nullable=True))
+    op.add_column('audit_logs', sa.Column('prev_hash', sa.String(length=64), nullable=True))
+    op.add_column('audit_logs', sa.Column('entry_hash', sa.String(length=64), nullable=True))
+    op.create_table('audit_checkpoints',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('last_audit_id', sa.Integer(), nullable=False),
+    sa.Column('rows_verified', sa.Integer(), nullable=False),
+    sa.Column('verified_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_audit_checkpoints_id'), 'audit_checkpoints', ['id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_audit_checkpoints_id'), table_name='audit_checkpoints')
+    op.drop_table('audit_checkpoints')
+    op.drop_column('audit_logs', 'entry_hash')
+    op.drop_column('audit_logs', 'prev_hash')
+    op.drop_column('tickets', 'audit_hash')
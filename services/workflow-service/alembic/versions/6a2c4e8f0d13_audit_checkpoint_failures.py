@@ -0,0 +1,24 @@
+"""Known failures on audit verification checkpoints
+
+Revision ID: 6a2c4e8f0d13
+Revises: 3d8f2a6c1b90
+Create Date: 2026-10-18 23:41:07.302518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a2c4e8f0d13'
+down_revision: Union[str, None] = '3d8f2a6c1b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.add_column('audit_checkpoints', sa.Column('failures', sa.JSON(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('audit_checkpoints', 'failures')
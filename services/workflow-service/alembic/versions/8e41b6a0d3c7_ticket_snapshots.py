@@ -0,0 +1,42 @@
+"""Ticket snapshots and audit field changes
+
+Revision ID: 8e41b6a0d3c7
+Revises: 5c0e7d2b9f14
+Create Date: 2026-10-18 10:03:12.402771
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41b6a0d3c7'
+down_revision: Union[str, None] = '5c0e7d2b9f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.add_column('audit_logs', sa.Column('changes', sa.JSON(), nullable=True))
+    op.create_table('ticket_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticket_id', sa.Integer(), nullable=False),
+    sa.Column('audit_log_id', sa.Integer(), nullable=False),
+    sa.Column('event_count', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.Column('state', sa.JSON(), nullable=False),
+    sa.ForeignKeyConstraint(['audit_log_id'], ['audit_logs.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ticket_snapshots_id'), 'ticket_snapshots', ['id'], unique=False)
+    op.create_index(op.f('ix_ticket_snapshots_ticket_id'), 'ticket_snapshots', ['ticket_id'], unique=False)
+    op.create_index(op.f('ix_ticket_snapshots_taken_at'), 'ticket_snapshots', ['taken_at'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ticket_snapshots_taken_at'), table_name='ticket_snapshots')
+    op.drop_index(op.f('ix_ticket_snapshots_ticket_id'), table_name='ticket_snapshots')
+    op.drop_index(op.f('ix_ticket_snapshots_id'), table_name='ticket_snapshots')
+    op.drop_table('ticket_snapshots')
+    op.drop_column('audit_logs', 'changes')
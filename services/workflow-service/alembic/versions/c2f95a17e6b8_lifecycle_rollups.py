@@ -0,0 +1,29 @@
+"""Lifecycle analytics rollups
+
+Revision ID: c2f95a17e6b8
+Revises: 8e41b6a0d3c7
+Create Date: 2026-10-18 11:20:47.930118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f95a17e6b8'
+down_revision: Union[str, None] = '8e41b6a0d3c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table('lifecycle_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+
+def downgrade() -> None:
+    op.drop_table('lifecycle_rollups')
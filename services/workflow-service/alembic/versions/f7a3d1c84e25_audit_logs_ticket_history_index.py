@@ -0,0 +1,24 @@
+"""Composite index for per-ticket history pages
+
+Revision ID: f7a3d1c84e25
+Revises: c2f95a17e6b8
+Create Date: 2026-10-18 12:02:55.647310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a3d1c84e25'
+down_revision: Union[str, None] = 'c2f95a17e6b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_index('ix_audit_logs_ticket_id_id', 'audit_logs', ['ticket_id', 'id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_audit_logs_ticket_id_id', table_name='audit_logs')
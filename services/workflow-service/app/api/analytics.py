@@ -0,0 +1,30 @@
+from typing import Optional
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.core.db import get_db
+from app.core.analytics import lifecycle_report
+from app.schemas.analytics import LifecycleReport
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+MAX_REPORT_DAYS = 366
+
+@router.get("/lifecycle", response_model=LifecycleReport)
+def get_lifecycle_analytics(
+    date_start: Optional[date] = None,
+    date_end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Time-in-state percentiles, per-reviewer resolution rates and rejection ratios.
+    Defaults to the last 30 days (UTC), today included.
+    """
+    date_end = date_end or datetime.utcnow().date()
+    date_start = date_start or date_end - timedelta(days=29)
+    if date_start > date_end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_start must not be after date_end.")
+    if (date_end - date_start).days >= MAX_REPORT_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Date range cannot exceed {MAX_REPORT_DAYS} days.")
+
+    return lifecycle_report(db, date_start, date_end)
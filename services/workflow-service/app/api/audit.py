@@ -4,7 +4,9 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from app.core.db import get_db
 from app.models.ticket import AuditLog
-from app.schemas.ticket import AuditLogResponse
+from app.schemas.ticket import AuditLogResponse, AuditVerificationResponse
+from app.core.audit import verify_audit_chain, merge_verification_reports, DEFAULT_VERIFY_BATCH_SIZE
+from app.core.sharding import scatter_gather, scatter_page
 
 router = APIRouter(prefix="/audit", tags=["Audit"])
 
@@ -20,13 +22,33 @@ def get_audit_logs(
     """
     Retrieve a list of immutable audit logs with optional filtering.
     """
-    query = db.query(AuditLog)
-    
+    def build_query(session: Session):
+        query = session.query(AuditLog)
+
+        if ticket_id is not None:
+            query = query.filter(AuditLog.ticket_id == ticket_id)
+        if actor is not None:
+            query = query.filter(AuditLog.actor == actor)
+        if action is not None:
+            query = query.filter(AuditLog.action == action)
+
+        return query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+
     if ticket_id is not None:
-        query = query.filter(AuditLog.ticket_id == ticket_id)
-    if actor is not None:
-        query = query.filter(AuditLog.actor == actor)
-    if action is not None:
-        query = query.filter(AuditLog.action == action)
-        
-    return query.order_by(AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
+        # A single ticket's rows live on one shard
+        return build_query(db).offset(skip).limit(limit).all()
+    return scatter_page(db, build_query, key=lambda row: (row.timestamp, row.id), skip=skip, limit=limit, reverse=True)
+
+
+@router.get("/verify", response_model=AuditVerificationResponse)
+def verify_audit_logs(
+    full: bool = False,
+    batch_size: int = Query(DEFAULT_VERIFY_BATCH_SIZE, ge=100, le=50000),
+    db: Session = Depends(get_db)
+):
+    """
+    Verify the per-ticket hash chains of the audit log.
+    Resumes from the last stored checkpoint unless `full` is set.
+    """
+    reports = scatter_gather(db, lambda session: verify_audit_chain(session, full=full, batch_size=batch_size))
+    return merge_verification_reports(reports)
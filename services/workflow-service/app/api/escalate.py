@@ -1,40 +1,61 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app.core.db import get_db
+from app.core.batching import GroupCommitter, get_group_committer
+from app.core.config import settings
+from app.core.history import embed_recent_history
 from app.models.ticket import Ticket
 from app.schemas.ticket import EscalationRequest, TicketResponse
 from app.core.fsm import TicketStateMachine
 
 router = APIRouter(prefix="/escalate", tags=["Escalation"])
 
-@router.post("", response_model=TicketResponse, status_code=status.HTTP_200_OK)
-def escalate_ticket(request: EscalationRequest, db: Session = Depends(get_db)):
+def apply_escalation(db: Session, request: EscalationRequest) -> Ticket:
     """
-    Trigger a state transition for a ticket according to strict FSM rules.
+    Load the ticket and apply the requested transition. Does NOT commit.
     """
-    ticket = db.query(Ticket).filter(Ticket.id == request.ticket_id).first()
+    # Locked so concurrent writers to the ticket append to its audit chain one after another
+    ticket = db.query(Ticket).with_for_update().filter(Ticket.id == request.ticket_id).first()
     if not ticket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
 
     fsm = TicketStateMachine(db)
-    
+    return fsm.transition(
+        ticket=ticket,
+        new_state=request.new_state.value,
+        actor=request.actor,
+        action=request.action,
+        reason=request.reason,
+        metadata_info=request.metadata_info
+    )
+
+@router.post("", response_model=TicketResponse, status_code=status.HTTP_200_OK)
+def escalate_ticket(
+    request: EscalationRequest,
+    db: Session = Depends(get_db),
+    committer: Optional[GroupCommitter] = Depends(get_group_committer)
+):
+    """
+    Trigger a state transition for a ticket according to strict FSM rules.
+    """
+    if committer is not None:
+        def work(session: Session) -> TicketResponse:
+            updated_ticket = apply_escalation(session, request)
+            session.flush()
+            return TicketResponse.model_validate(embed_recent_history(session, [updated_ticket], settings.HISTORY_EMBED_LIMIT)[0])
+        return committer.submit(work)
+
     try:
-        updated_ticket = fsm.transition(
-            ticket=ticket,
-            new_state=request.new_state.value,
-            actor=request.actor,
-            action=request.action,
-            reason=request.reason,
-            metadata_info=request.metadata_info
-        )
+        updated_ticket = apply_escalation(db, request)
         
         db.commit()
         db.refresh(updated_ticket)
-        return updated_ticket
+        return embed_recent_history(db, [updated_ticket], settings.HISTORY_EMBED_LIMIT)[0]
         
     except HTTPException:
         db.rollback()
-        raise # Reraise the 409 conflict exactly as produced by fsm
+        raise # Reraise the 404/409 exactly as produced
     except Exception as e:
         db.rollback()
         raise e
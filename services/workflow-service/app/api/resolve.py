@@ -1,20 +1,23 @@
+from typing import Optional
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app.core.db import get_db
+from app.core.batching import GroupCommitter, get_group_committer
+from app.core.config import settings
+from app.core.history import embed_recent_history
 from app.models.ticket import Ticket
 from app.schemas.ticket import ResolutionRequest, TicketResponse
 from app.core.fsm import TicketStateMachine, TicketState
 
 router = APIRouter(prefix="/resolve", tags=["Resolution"])
 
-@router.post("", response_model=TicketResponse, status_code=status.HTTP_200_OK)
-def resolve_ticket(request: ResolutionRequest, db: Session = Depends(get_db)):
+def apply_resolution(db: Session, request: ResolutionRequest) -> Ticket:
     """
-    Capture a human reviewer's final decision on a ticket.
-    Validates that the ticket is in a resolvable state and logs the resolution.
+    Load the ticket and record the reviewer's final decision. Does NOT commit.
     """
-    ticket = db.query(Ticket).filter(Ticket.id == request.ticket_id).first()
+    # Locked so concurrent writers to the ticket append to its audit chain one after another
+    ticket = db.query(Ticket).with_for_update().filter(Ticket.id == request.ticket_id).first()
     if not ticket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
         
@@ -22,24 +25,43 @@ def resolve_ticket(request: ResolutionRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid resolution status. Must be RESOLVED or REJECTED.")
 
     fsm = TicketStateMachine(db)
-    
-    try:
-        updated_ticket = fsm.transition(
-            ticket=ticket,
-            new_state=request.resolution_status.value,
-            actor=request.actor,
-            action="resolve",
-            reason=f"Final Decision: {request.final_decision}. Rationale: {request.reason}"
-        )
-        
+    return fsm.transition(
+        ticket=ticket,
+        new_state=request.resolution_status.value,
+        actor=request.actor,
+        action="resolve",
+        reason=f"Final Decision: {request.final_decision}. Rationale: {request.reason}",
         # Enforce Section 3: Persist the resolution with reviewer identity, decision, timestamp
-        updated_ticket.resolution = request.final_decision
-        updated_ticket.resolved_by = request.actor
-        updated_ticket.resolved_at = datetime.utcnow()
+        changes={
+            "resolution": request.final_decision,
+            "resolved_by": request.actor,
+            "resolved_at": datetime.utcnow()
+        }
+    )
+
+@router.post("", response_model=TicketResponse, status_code=status.HTTP_200_OK)
+def resolve_ticket(
+    request: ResolutionRequest,
+    db: Session = Depends(get_db),
+    committer: Optional[GroupCommitter] = Depends(get_group_committer)
+):
+    """
+    Capture a human reviewer's final decision on a ticket.
+    Validates that the ticket is in a resolvable state and logs the resolution.
+    """
+    if committer is not None:
+        def work(session: Session) -> TicketResponse:
+            updated_ticket = apply_resolution(session, request)
+            session.flush()
+            return TicketResponse.model_validate(embed_recent_history(session, [updated_ticket], settings.HISTORY_EMBED_LIMIT)[0])
+        return committer.submit(work)
+
+    try:
+        updated_ticket = apply_resolution(db, request)
         
         db.commit()
         db.refresh(updated_ticket)
-        return updated_ticket
+        return embed_recent_history(db, [updated_ticket], settings.HISTORY_EMBED_LIMIT)[0]
         
     except HTTPException:
         db.rollback()
@@ -1,14 +1,45 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, defer, load_only
 from app.core.db import get_db
+from app.core.batching import GroupCommitter, get_group_committer
 from app.models.ticket import Ticket, AuditLog
-from app.schemas.ticket import TicketCreate, TicketResponse, TicketUpdate, TicketStateEnum
-from app.core.fsm import TicketStateMachine, TicketState
+from app.core.config import settings
+from app.schemas.ticket import TicketCreate, TicketResponse, TicketUpdate, TicketStateEnum, TicketLookupRequest, TicketLookupResponse, TicketHistoryPage, IngestResponse, IngestStatusEnum, SimilarTicket
+from app.core.audit import record_event
+from app.core.ingest import create_tickets, ingest_batch, iter_frames
+from app.core.history import embed_recent_history, reconstruct_tickets, to_naive_utc
+from app.core.sharding import scatter_page
+from app.core.similarity import find_similar
 
 router = APIRouter(prefix="/tickets", tags=["Tickets"])
 
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack")
+
+PROJECTABLE_FIELDS = [field for field in TicketResponse.model_fields if field != "history_count"]
+MAX_HISTORY_PAGE = 200
+AS_OF_SCAN_CHUNK = 500
+MAX_SIMILAR_TICKETS = 100
+
+def parse_fields(fields: List[str]) -> List[str]:
+    """
+    Validate a ticket field projection. The id is always included.
+    """
+    requested = [field.strip() for field in fields if field.strip()]
+    unknown = sorted(set(requested) - set(PROJECTABLE_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["id"] + requested))
+
+def project_ticket(ticket: Union[Ticket, Dict[str, Any]], fields: List[str]) -> Dict[str, Any]:
+    if isinstance(ticket, dict):
+        return {field: ticket.get(field) for field in fields}
+    return {field: getattr(ticket, field) for field in fields}
+
 @router.post("", response_model=TicketResponse, status_code=status.HTTP_201_CREATED)
 def create_ticket(ticket_in: TicketCreate, db: Session = Depends(get_db)):
     """
@@ -16,62 +47,99 @@ def create_ticket(ticket_in: TicketCreate, db: Session = Depends(get_db)):
     Captures query data, AI decision, and atomitcally creates the initial history log.
     Includes idempotency check based on source_query.
     """
-    # Idempotency check: Reject duplicate source queries that are CREATED
-    existing_ticket = db.query(Ticket).filter(
-        Ticket.source_query == ticket_in.source_query,
-        Ticket.status == TicketState.CREATED
-    ).first()
-    
-    if existing_ticket:
-        return existing_ticket
-
     try:
-        db_ticket = Ticket(
-            source_query=ticket_in.source_query,
-            agent_decision=ticket_in.agent_decision,
-            confidence_score=ticket_in.confidence_score,
-            escalation_reason=ticket_in.escalation_reason,
-            assigned_to=ticket_in.assigned_to,
-            status=TicketState.CREATED
-        )
-        db.add(db_ticket)
-        db.flush()
-
-        # Generate initial history logic inline to comply with JSON array requirements
-        fsm = TicketStateMachine(db)
-        # Using the transition method just for the initial log is a bit hacky, 
-        # so we'll just insert the first TicketHistory/AuditLog manually as this is creation, not transition.
-        timestamp = datetime.utcnow()
-        timestamp_iso = timestamp.isoformat()
-        
-        log_entry = {
-            "action": "CREATE",
-            "actor": "system",
-            "previous_state": None,
-            "new_state": TicketState.CREATED,
-            "reason": "Initial escalation creation",
-            "timestamp": timestamp_iso
-        }
-        db_ticket.history_log = [log_entry]
-
-        audit_entry = AuditLog(
-            ticket_id=db_ticket.id,
-            actor="system",
-            action="CREATE",
-            previous_state=None,
-            new_state=TicketState.CREATED,
-            reason="Initial escalation creation",
-            timestamp=timestamp
-        )
-        db.add(audit_entry)
+        # Idempotency check: an existing CREATED ticket for the same source query is returned as is
+        [(db_ticket, created)] = create_tickets(db, [ticket_in])
+        if not created:
+            return embed_recent_history(db, [db_ticket], settings.HISTORY_EMBED_LIMIT)[0]
         db.commit()
         db.refresh(db_ticket)
-        return db_ticket
+        return embed_recent_history(db, [db_ticket], settings.HISTORY_EMBED_LIMIT)[0]
     except Exception as e:
         db.rollback()
         raise e
 
 
+@router.post("/ingest", response_model=IngestResponse)
+async def ingest_tickets(request: Request, db: Session = Depends(get_db)):
+    """
+    Bulk-create tickets from a stream of MessagePack-encoded TicketCreate maps, each
+    prefixed with its 4-byte big-endian length.
+    Frames are buffered in batches of INGEST_BATCH_SIZE; each batch is decoded, validated
+    and inserted in the threadpool, in one transaction, with the same idempotency rule as
+    single creation.
+    Every record gets an acknowledgement; invalid records do not affect the others.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in MSGPACK_CONTENT_TYPES:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Expected an application/msgpack body.")
+
+    # Frames are only buffered here; decoding and validation run with the insert in the threadpool
+    acks: List[Dict[str, Any]] = []
+    batch = []
+    index = 0
+    async for frame in iter_frames(request.stream()):
+        batch.append((index, frame))
+        index += 1
+        if len(batch) >= settings.INGEST_BATCH_SIZE:
+            acks.extend(await run_in_threadpool(ingest_batch, db, batch))
+            batch = []
+    if batch:
+        acks.extend(await run_in_threadpool(ingest_batch, db, batch))
+
+    acks.sort(key=lambda ack: ack["index"])
+    counts = {status_value: 0 for status_value in IngestStatusEnum}
+    for ack in acks:
+        counts[IngestStatusEnum(ack["status"])] += 1
+    return {
+        "received": index,
+        "created": counts[IngestStatusEnum.CREATED],
+        "duplicates": counts[IngestStatusEnum.DUPLICATE],
+        "rejected": counts[IngestStatusEnum.INVALID] + counts[IngestStatusEnum.FAILED],
+        "acks": acks,
+    }
+
+
+def historical_page(
+    db: Session,
+    build_query,
+    as_of: datetime,
+    status_value: Optional[str],
+    assigned_to: Optional[str],
+    skip: int,
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    Page through tickets whose reconstructed state at `as_of` matches the filters.
+    Candidates are rebuilt in id order, AS_OF_SCAN_CHUNK at a time, until the page is full.
+    """
+    page: List[Dict[str, Any]] = []
+    to_skip = skip
+    after_id = 0
+    while len(page) < limit:
+        chunk = scatter_page(
+            db, lambda session: build_query(session).filter(Ticket.id > after_id),
+            key=lambda ticket: ticket.id, skip=0, limit=AS_OF_SCAN_CHUNK,
+        )
+        if not chunk:
+            break
+        states = reconstruct_tickets(db, chunk, as_of)
+        for ticket in chunk:
+            state = states.get(ticket.id)
+            if state is None or (status_value is not None and state["status"] != status_value):
+                continue
+            if assigned_to is not None and state["assigned_to"] != assigned_to:
+                continue
+            if to_skip:
+                to_skip -= 1
+                continue
+            page.append(state)
+            if len(page) == limit:
+                break
+        after_id = chunk[-1].id
+    return page
+
+
 @router.get("", response_model=List[TicketResponse])
 def get_tickets(
     skip: int = Query(0, ge=0),
@@ -80,80 +148,230 @@ def get_tickets(
     assigned_to: Optional[str] = None,
     date_start: Optional[datetime] = None,
     date_end: Optional[datetime] = None,
+    as_of: Optional[datetime] = Query(None, description="Return tickets as they were at this point in time."),
+    fields: Optional[str] = Query(None, description="Comma-separated ticket fields to return; id is always included."),
     db: Session = Depends(get_db)
 ):
     """
     Retrieve a list of tickets with optional filtering.
+    With `as_of`, tickets created by then are returned in their state at that time;
+    `status` and `assigned_to` then match that historical state.
+    With `fields`, only the requested columns are loaded and returned.
     """
-    query = db.query(Ticket)
-    
-    if status is not None:
-        query = query.filter(Ticket.status == status.value)
-    if assigned_to is not None:
-        query = query.filter(Ticket.assigned_to == assigned_to)
-    if date_start is not None:
-        query = query.filter(Ticket.created_at >= date_start)
-    if date_end is not None:
-        query = query.filter(Ticket.created_at <= date_end)
-        
-    return query.offset(skip).limit(limit).all()
+    projection = parse_fields(fields.split(",")) if fields else None
+    as_of, date_start, date_end = to_naive_utc(as_of), to_naive_utc(date_start), to_naive_utc(date_end)
+
+    def build_query(session: Session):
+        query = session.query(Ticket)
+        if as_of is not None:
+            query = query.filter(Ticket.created_at <= as_of)
+        elif projection is not None:
+            query = query.options(load_only(*[getattr(Ticket, field) for field in projection]))
+
+        # With as_of these filters apply to the reconstructed state instead
+        if status is not None and as_of is None:
+            query = query.filter(Ticket.status == status.value)
+        if assigned_to is not None and as_of is None:
+            query = query.filter(Ticket.assigned_to == assigned_to)
+        if date_start is not None:
+            query = query.filter(Ticket.created_at >= date_start)
+        if date_end is not None:
+            query = query.filter(Ticket.created_at <= date_end)
+        return query.order_by(Ticket.id)
+
+    if as_of is None:
+        tickets = scatter_page(db, build_query, key=lambda ticket: ticket.id, skip=skip, limit=limit)
+    elif status is None and assigned_to is None:
+        tickets = scatter_page(db, build_query, key=lambda ticket: ticket.id, skip=skip, limit=limit)
+        states = reconstruct_tickets(db, tickets, as_of)
+        tickets = [states[ticket.id] for ticket in tickets if ticket.id in states]
+    else:
+        tickets = historical_page(db, build_query, as_of, status.value if status is not None else None, assigned_to, skip, limit)
+    if projection is None:
+        return tickets
+
+    # Partial tickets do not satisfy TicketResponse, so they bypass response_model
+    return JSONResponse(jsonable_encoder([project_ticket(ticket, projection) for ticket in tickets]))
+
+
+@router.post("/lookup", response_model=TicketLookupResponse)
+def lookup_tickets(lookup: TicketLookupRequest, db: Session = Depends(get_db)):
+    """
+    Fetch many tickets by id with a single query.
+    Results follow the request order (duplicates collapsed); unknown ids are listed in `missing`.
+    Accepts the same field projection as the list view.
+    """
+    projection = parse_fields(lookup.fields) if lookup.fields else None
+    ids = list(dict.fromkeys(lookup.ids))
+
+    # history_log is embedded from the audit trail, bounded like the single-ticket view
+    query = db.query(Ticket).filter(Ticket.id.in_(ids))
+    if projection is not None:
+        query = query.options(load_only(*[getattr(Ticket, field) for field in projection if field != "history_log"]))
+    else:
+        query = query.options(defer(Ticket.history_log))
+    tickets = query.all()
+    if projection is None or "history_log" in projection:
+        embedded = embed_recent_history(db, tickets, settings.HISTORY_EMBED_LIMIT)
+        histories = {response["id"]: response for response in embedded}
+    found = {ticket.id: ticket for ticket in tickets}
+
+    results = []
+    for ticket_id in ids:
+        if ticket_id not in found:
+            continue
+        if projection is None:
+            results.append(TicketResponse.model_validate(histories[ticket_id]).model_dump())
+            continue
+        result = {field: getattr(found[ticket_id], field) for field in projection if field != "history_log"}
+        if "history_log" in projection:
+            result["history_log"] = histories[ticket_id]["history_log"]
+        results.append(result)
+
+    return {
+        "tickets": results,
+        "missing": [ticket_id for ticket_id in ids if ticket_id not in found],
+    }
 
 
 @router.get("/{ticket_id}", response_model=TicketResponse)
-def get_ticket(ticket_id: int, db: Session = Depends(get_db)):
+def get_ticket(
+    ticket_id: int,
+    as_of: Optional[datetime] = Query(None, description="Return the ticket as it was at this point in time."),
+    history_limit: int = Query(settings.HISTORY_EMBED_LIMIT, ge=0, le=MAX_HISTORY_PAGE, description="Number of most recent history entries to embed."),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve a specific ticket by ID, including its history.
+    Retrieve a specific ticket by ID, including its most recent history entries.
+    `history_count` gives the total; older entries are paged through /tickets/{id}/history.
+    With `as_of`, the ticket state is reconstructed from its snapshots and audit trail.
     """
-    ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
+    ticket = db.query(Ticket).options(defer(Ticket.history_log)).filter(Ticket.id == ticket_id).first()
     if not ticket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-    return ticket
 
+    as_of = to_naive_utc(as_of)
+    if as_of is None:
+        return embed_recent_history(db, [ticket], history_limit)[0]
 
-@router.patch("/{ticket_id}", response_model=TicketResponse)
-def update_ticket(ticket_id: int, update_data: TicketUpdate, db: Session = Depends(get_db)):
+    states = reconstruct_tickets(db, [ticket], as_of)
+    if ticket.id not in states:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket did not exist at the requested time")
+    response = states[ticket.id]
+    total = len(response["history_log"])
+    history = response["history_log"][total - history_limit:] if history_limit else []
+
+    response["history_log"] = history
+    response["history_count"] = total
+    return response
+
+
+@router.get("/{ticket_id}/history", response_model=TicketHistoryPage)
+def get_ticket_history(
+    ticket_id: int,
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page."),
+    limit: int = Query(50, ge=1, le=MAX_HISTORY_PAGE),
+    db: Session = Depends(get_db)
+):
     """
-    Partially update mutable fields on a ticket.
-    Currently allows updating assigned_to. Status updates MUST go through /escalate or /resolve.
+    Page through a ticket's history entries, newest first.
+    """
+    if db.query(Ticket.id).filter(Ticket.id == ticket_id).first() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+
+    query = db.query(AuditLog).filter(AuditLog.ticket_id == ticket_id)
+    if cursor is not None:
+        query = query.filter(AuditLog.id < cursor)
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(AuditLog.id.desc()).limit(limit + 1).all()
+
+    items = rows[:limit]
+    return {
+        "items": items,
+        "next_cursor": items[-1].id if len(rows) > limit else None,
+    }
+
+
+@router.get("/{ticket_id}/similar", response_model=List[SimilarTicket])
+def get_similar_tickets(
+    ticket_id: int,
+    limit: int = Query(10, ge=1, le=MAX_SIMILAR_TICKETS),
+    min_similarity: Optional[float] = Query(None, ge=0, le=1, description="Defaults to SIMILARITY_THRESHOLD."),
+    db: Session = Depends(get_db)
+):
+    """
+    Tickets whose source_query looks like a rephrasing of this one, most similar first.
+    Candidates come from the MinHash/LSH index, so this never scans all tickets.
+    """
+    if db.query(Ticket.id).filter(Ticket.id == ticket_id).first() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+
+    threshold = settings.SIMILARITY_THRESHOLD if min_similarity is None else min_similarity
+    matches = find_similar(db, ticket_id, threshold)[:limit]
+    if not matches:
+        return []
+    found = {
+        ticket.id: ticket
+        for ticket in db.query(Ticket).options(defer(Ticket.history_log)).filter(Ticket.id.in_([match_id for match_id, _ in matches]))
+    }
+    return [
+        {**project_ticket(found[match_id], ["id", "source_query", "status", "created_at", "duplicate_of"]), "similarity": similarity}
+        for match_id, similarity in matches if match_id in found
+    ]
+
+
+def apply_update(db: Session, ticket_id: int, update_data: TicketUpdate) -> Ticket:
+    """
+    Load the ticket and apply a partial update. Does NOT commit.
     """
-    ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
+    # Locked so concurrent writers to the ticket append to its audit chain one after another
+    ticket = db.query(Ticket).with_for_update().filter(Ticket.id == ticket_id).first()
     if not ticket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
     
     if update_data.status is not None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Status cannot be updated directly. Use /escalate or /resolve.")
 
+    if update_data.assigned_to is not None:
+        ticket.assigned_to = update_data.assigned_to
+
+        # Audit log this assignment mutation and record it on the ticket log
+        record_event(
+            db,
+            ticket,
+            actor="system",
+            action="UPDATE_ASSIGNMENT",
+            previous_state=ticket.status,
+            new_state=ticket.status,
+            reason=f"Assigned to {update_data.assigned_to}",
+            changes={"assigned_to": update_data.assigned_to}
+        )
+    return ticket
+
+
+@router.patch("/{ticket_id}", response_model=TicketResponse)
+def update_ticket(
+    ticket_id: int,
+    update_data: TicketUpdate,
+    db: Session = Depends(get_db),
+    committer: Optional[GroupCommitter] = Depends(get_group_committer)
+):
+    """
+    Partially update mutable fields on a ticket.
+    Currently allows updating assigned_to. Status updates MUST go through /escalate or /resolve.
+    """
+    if committer is not None:
+        def work(session: Session) -> TicketResponse:
+            ticket = apply_update(session, ticket_id, update_data)
+            session.flush()
+            return TicketResponse.model_validate(embed_recent_history(session, [ticket], settings.HISTORY_EMBED_LIMIT)[0])
+        return committer.submit(work)
+
     try:
-        if update_data.assigned_to is not None:
-            # Audit log this assignment mutation
-            audit_entry = AuditLog(
-                ticket_id=ticket.id,
-                actor="system",
-                action="UPDATE_ASSIGNMENT",
-                previous_state=ticket.status,
-                new_state=ticket.status,
-                reason=f"Assigned to {update_data.assigned_to}"
-            )
-            db.add(audit_entry)
-            
-            # Record directly on the ticket log
-            log_entry = {
-                "action": "UPDATE_ASSIGNMENT",
-                "actor": "system",
-                "previous_state": ticket.status,
-                "new_state": ticket.status,
-                "reason": f"Assigned to {update_data.assigned_to}",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            current_history = list(ticket.history_log)
-            current_history.append(log_entry)
-            ticket.history_log = current_history
-            
-            ticket.assigned_to = update_data.assigned_to
-            
+        ticket = apply_update(db, ticket_id, update_data)
         db.commit()
         db.refresh(ticket)
-        return ticket
+        return embed_recent_history(db, [ticket], settings.HISTORY_EMBED_LIMIT)[0]
     except Exception as e:
         db.rollback()
         raise e
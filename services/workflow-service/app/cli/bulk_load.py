@@ -0,0 +1,400 @@
+"""
+Offline bulk loader for historical escalations.
+
+    python -m app.cli.bulk_load escalations.jsonl [--format csv|jsonl] [--batch-size 5000]
+        [--drop-indexes] [--checkpoint PATH] [--database-url URL]
+
+Each input record has the POST /tickets fields plus an optional ISO `created_at`.
+Tickets are written with the same initial history entry, hash-chained CREATE audit
+row, similarity index rows and duplicate_of link as create_ticket, using COPY on
+PostgreSQL and executemany batches elsewhere. Records whose source_query matches a CREATED ticket
+(already stored or earlier in the load) are skipped, like the create_ticket
+idempotency check. Records that cannot be decoded or validated are counted as invalid
+and skipped. Every batch is one transaction followed by a checkpoint, so a
+failed load resumes from the last committed batch when run again.
+
+The loader assumes it is the only writer while it runs; stop the API first.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+from pydantic import ValidationError
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.core.audit import compute_audit_hash
+from app.core.config import settings
+from app.core.db import create_db_engine
+from app.core.fsm import TicketState
+from app.core.history import history_entry, serialize_state, to_naive_utc
+from app.core.similarity import band_keys, match_new_tickets, minhash_signature
+from app.models.ticket import Ticket, AuditLog, TicketSignature, TicketLshBucket
+from app.schemas.ticket import TicketCreate
+
+logger = logging.getLogger("bulk_load")
+
+DEFAULT_BATCH_SIZE = 5000
+TICKET_COLUMNS = [
+    "id", "source_query", "agent_decision", "confidence_score", "escalation_reason", "assigned_to",
+    "status", "created_at", "updated_at", "history_log", "audit_hash", "duplicate_of",
+]
+AUDIT_COLUMNS = [
+    "ticket_id", "actor", "action", "previous_state", "new_state", "reason", "metadata_info",
+    "changes", "timestamp", "prev_hash", "entry_hash",
+]
+# Secondary indexes that --drop-indexes removes for the load and rebuilds afterwards
+LOAD_TABLES = [Ticket.__table__, AuditLog.__table__]
+
+
+# Input
+
+def _is_utf8(values: List[Any]) -> bool:
+    # Undecodable input bytes survive as lone surrogates, which cannot be re-encoded
+    try:
+        for value in values:
+            if isinstance(value, str):
+                value.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def read_records(path: str, fmt: str) -> Iterator[Union[Dict[str, Any], ValueError]]:
+    """
+    Yield each input record, or a ValueError for one that cannot be decoded, so a
+    malformed line is counted as invalid instead of stopping every (resumed) run.
+    """
+    with open(path, newline="", encoding="utf-8", errors="surrogateescape") as handle:
+        if fmt == "csv":
+            reader = csv.DictReader(handle)
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    # The reader carries on with the next line
+                    yield ValueError(f"malformed CSV: {e}")
+                    continue
+                if not _is_utf8(list(row.values())):
+                    yield ValueError("not valid UTF-8")
+                    continue
+                # CSV has no null; empty cells are missing values
+                yield {key: value for key, value in row.items() if value != ""}
+        else:
+            for line in handle:
+                if not line.strip():
+                    continue
+                if not _is_utf8([line]):
+                    yield ValueError("not valid UTF-8")
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield ValueError(f"malformed JSON: {e}")
+
+
+def parse_record(raw: Union[Dict[str, Any], ValueError]) -> Tuple[TicketCreate, datetime]:
+    """
+    Validate one input record. Raises ValueError with a readable message.
+    """
+    if isinstance(raw, ValueError):
+        raise raw
+    try:
+        ticket_in = TicketCreate.model_validate(raw)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()))
+
+    created_at = raw.get("created_at")
+    if created_at is None:
+        return ticket_in, datetime.utcnow()
+    return ticket_in, to_naive_utc(datetime.fromisoformat(str(created_at).replace("Z", "+00:00")))
+
+
+def query_key(source_query: str) -> bytes:
+    # Digests keep the in-memory dedup set small for millions of queries
+    return hashlib.blake2b(source_query.encode("utf-8"), digest_size=16).digest()
+
+
+# Checkpoints
+
+def load_checkpoint(path: str, input_path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"input": input_path, "records": 0, "loaded": 0, "duplicates": 0, "invalid": 0, "complete": False}
+    with open(path, encoding="utf-8") as handle:
+        checkpoint = json.load(handle)
+    if checkpoint["input"] != input_path:
+        raise SystemExit(f"Checkpoint {path} belongs to {checkpoint['input']}, not {input_path}")
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    # Write then rename so a crash never leaves a truncated checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(checkpoint, handle)
+    os.replace(tmp_path, path)
+
+
+# Writers
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bytes):
+        return "\\\\x" + value.hex()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_rows(conn: Connection, table: str, columns: List[str], rows: List[Dict[str, Any]]) -> None:
+    """
+    Stream rows into a PostgreSQL table with COPY in text format, inside conn's transaction.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[column]) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+class BulkLoader:
+    def __init__(self, engine: Engine, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.use_copy = engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+        self.seen: Set[bytes] = set()
+        self._next_id: Optional[int] = None
+
+    def load_existing_queries(self) -> None:
+        """
+        Remember the source queries of CREATED tickets, which create_ticket would not duplicate.
+        """
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(
+                select(Ticket.source_query).where(Ticket.status == TicketState.CREATED)
+            )
+            for (source_query,) in result:
+                self.seen.add(query_key(source_query))
+
+    def reserve_ids(self, conn: Connection, count: int) -> List[int]:
+        if self.engine.dialect.name == "postgresql":
+            return list(conn.execute(
+                text("SELECT nextval(pg_get_serial_sequence('tickets', 'id')) FROM generate_series(1, :count)"),
+                {"count": count},
+            ).scalars())
+        # Elsewhere ids continue after the current maximum; safe because the loader is the only writer
+        if self._next_id is None:
+            self._next_id = (conn.execute(select(func.max(Ticket.id))).scalar() or 0) + 1
+        ids = list(range(self._next_id, self._next_id + count))
+        self._next_id += count
+        return ids
+
+    def build_rows(self, conn: Connection, records: List[Tuple[TicketCreate, datetime]], ids: List[int]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Ticket, audit and similarity index rows matching what create_ticket writes,
+        including the `duplicate_of` link to the most similar earlier ticket.
+        """
+        minhashes = {ticket_id: minhash_signature(ticket_in.source_query) for (ticket_in, _), ticket_id in zip(records, ids)}
+        minhashes = {ticket_id: signature for ticket_id, signature in minhashes.items() if signature is not None}
+        with Session(bind=conn) as session:
+            duplicates = match_new_tickets(session, minhashes)
+
+        tickets, audit_logs, signatures, buckets = [], [], [], []
+        for (ticket_in, created_at), ticket_id in zip(records, ids):
+            changes = serialize_state({"assigned_to": ticket_in.assigned_to})
+            audit_row = {
+                "ticket_id": ticket_id,
+                "actor": "system",
+                "action": "CREATE",
+                "previous_state": None,
+                "new_state": TicketState.CREATED,
+                "reason": "Initial escalation creation",
+                "metadata_info": None,
+                "changes": changes,
+                "timestamp": created_at,
+                "prev_hash": None,
+            }
+            audit_row["entry_hash"] = compute_audit_hash(
+                None, ticket_id, "system", "CREATE", None, TicketState.CREATED,
+                audit_row["reason"], None, created_at, changes,
+            )
+            audit_logs.append(audit_row)
+            tickets.append({
+                "id": ticket_id,
+                "source_query": ticket_in.source_query,
+                "agent_decision": ticket_in.agent_decision,
+                "confidence_score": ticket_in.confidence_score,
+                "escalation_reason": ticket_in.escalation_reason,
+                "assigned_to": ticket_in.assigned_to,
+                "status": TicketState.CREATED,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "history_log": [history_entry(AuditLog(**audit_row))],
+                "audit_hash": audit_row["entry_hash"],
+                "duplicate_of": duplicates.get(ticket_id),
+            })
+            # A single event never reaches SNAPSHOT_INTERVAL, so no snapshot rows are needed
+            signature = minhashes.get(ticket_id)
+            if signature is not None:
+                signatures.append({"ticket_id": ticket_id, "signature": signature.tobytes()})
+                buckets.extend({"bucket": key, "ticket_id": ticket_id} for key in band_keys(signature))
+        return {"tickets": tickets, "audit_logs": audit_logs, "ticket_signatures": signatures, "ticket_lsh_buckets": buckets}
+
+    def write(self, conn: Connection, rows: Dict[str, List[Dict[str, Any]]]) -> None:
+        tables = [
+            (Ticket.__table__, TICKET_COLUMNS),
+            (AuditLog.__table__, AUDIT_COLUMNS),
+            (TicketSignature.__table__, ["ticket_id", "signature"]),
+            (TicketLshBucket.__table__, ["bucket", "ticket_id"]),
+        ]
+        for table, columns in tables:
+            table_rows = rows[table.name]
+            if not table_rows:
+                continue
+            if self.use_copy:
+                copy_rows(conn, table.name, columns, table_rows)
+            else:
+                conn.execute(table.insert(), table_rows)
+
+    def load_batch(self, raw_records: List[Dict[str, Any]], first_index: int, checkpoint: Dict[str, Any]) -> int:
+        """
+        Validate, dedup and write one batch in a single transaction. Returns the number of tickets written.
+        """
+        records = []
+        batch_keys = []
+        for offset, raw in enumerate(raw_records):
+            try:
+                ticket_in, created_at = parse_record(raw)
+            except ValueError as e:
+                checkpoint["invalid"] += 1
+                logger.warning("Record %d skipped: %s", first_index + offset + 1, e)
+                continue
+            key = query_key(ticket_in.source_query)
+            if key in self.seen:
+                checkpoint["duplicates"] += 1
+                continue
+            self.seen.add(key)
+            batch_keys.append(key)
+            records.append((ticket_in, created_at))
+
+        try:
+            with self.engine.begin() as conn:
+                if records:
+                    self.write(conn, self.build_rows(conn, records, self.reserve_ids(conn, len(records))))
+        except Exception:
+            # The batch was rolled back; its queries must not count as loaded
+            self.seen.difference_update(batch_keys)
+            raise
+        return len(records)
+
+    def run(self, records: Iterator[Dict[str, Any]], checkpoint: Dict[str, Any], checkpoint_path: str) -> None:
+        skip = checkpoint["records"]
+        if skip:
+            logger.info("Resuming after record %d", skip)
+        started = time.monotonic()
+        loaded_this_run = 0
+
+        batch: List[Dict[str, Any]] = []
+        index = 0
+        for raw in records:
+            index += 1
+            if index <= skip:
+                continue
+            batch.append(raw)
+            if len(batch) >= self.batch_size:
+                loaded_this_run += self._commit(batch, index, checkpoint, checkpoint_path, started, loaded_this_run)
+                batch = []
+        if batch:
+            loaded_this_run += self._commit(batch, index, checkpoint, checkpoint_path, started, loaded_this_run)
+
+        checkpoint["complete"] = True
+        save_checkpoint(checkpoint_path, checkpoint)
+        elapsed = time.monotonic() - started
+        logger.info(
+            "Done: %d tickets loaded in %.1fs (%.0f tickets/s); totals: %d records, %d loaded, %d duplicates, %d invalid",
+            loaded_this_run, elapsed, loaded_this_run / elapsed if elapsed else 0,
+            checkpoint["records"], checkpoint["loaded"], checkpoint["duplicates"], checkpoint["invalid"],
+        )
+
+    def _commit(self, batch: List[Dict[str, Any]], last_index: int, checkpoint: Dict[str, Any], checkpoint_path: str, started: float, loaded_before: int) -> int:
+        loaded = self.load_batch(batch, last_index - len(batch), checkpoint)
+        checkpoint["records"] = last_index
+        checkpoint["loaded"] += loaded
+        save_checkpoint(checkpoint_path, checkpoint)
+        elapsed = time.monotonic() - started
+        logger.info(
+            "%d records read, %d tickets loaded (%.0f tickets/s)",
+            last_index, checkpoint["loaded"], (loaded_before + loaded) / elapsed if elapsed else 0,
+        )
+        return loaded
+
+
+def drop_indexes(engine: Engine) -> None:
+    with engine.begin() as conn:
+        for table in LOAD_TABLES:
+            for index in table.indexes:
+                index.drop(conn, checkfirst=True)
+
+
+def rebuild_indexes(engine: Engine) -> None:
+    started = time.monotonic()
+    with engine.begin() as conn:
+        for table in LOAD_TABLES:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    logger.info("Indexes rebuilt in %.1fs", time.monotonic() - started)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load historical escalations into tickets and audit_logs.")
+    parser.add_argument("input", help="CSV or JSONL file of tickets")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format; defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Records per transaction")
+    parser.add_argument("--drop-indexes", action="store_true", help="Drop secondary indexes during the load and rebuild them afterwards")
+    parser.add_argument("--checkpoint", help="Checkpoint file; defaults to <input>.checkpoint")
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(message)s")
+    if settings.SHARD_URLS and not args.database_url:
+        # Sharded ticket ids must encode their shard, which this loader does not mint
+        raise SystemExit("Bulk loading into a sharded deployment is not supported")
+
+    input_path = os.path.abspath(args.input)
+    fmt = args.format or ("csv" if input_path.lower().endswith(".csv") else "jsonl")
+    checkpoint_path = args.checkpoint or f"{input_path}.checkpoint"
+    checkpoint = load_checkpoint(checkpoint_path, input_path)
+    if checkpoint["complete"]:
+        logger.info("%s was already loaded completely (see %s)", input_path, checkpoint_path)
+        return
+
+    engine = create_db_engine(args.database_url or settings.DATABASE_URL)
+    loader = BulkLoader(engine, args.batch_size)
+    loader.load_existing_queries()
+    if args.drop_indexes:
+        # If the load fails the indexes stay dropped until a resumed run rebuilds them
+        drop_indexes(engine)
+    loader.run(read_records(input_path, fmt), checkpoint, checkpoint_path)
+    if args.drop_indexes:
+        rebuild_indexes(engine)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
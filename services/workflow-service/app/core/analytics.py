@@ -0,0 +1,270 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.fsm import TicketState
+from app.core.sharding import scatter_gather
+from app.models.ticket import AuditLog, LifecycleRollup
+
+LOAD_BATCH_SIZE = 20000
+
+# Log-spaced duration buckets (seconds) from 1s to ~1 year; percentiles are interpolated within a bucket
+BUCKET_EDGES = np.concatenate(([0.0], np.geomspace(1.0, 366 * 86400.0, 160)))
+NUM_BUCKETS = len(BUCKET_EDGES)
+
+STATES = [
+    TicketState.CREATED, TicketState.TRIAGED, TicketState.ASSIGNED, TicketState.IN_REVIEW,
+    TicketState.RESOLVED, TicketState.ESCALATED_FURTHER, TicketState.REJECTED,
+]
+DECISION_STATES = (TicketState.RESOLVED, TicketState.REJECTED)
+
+
+def _state_changes():
+    # Assignment updates keep the state unchanged and must not split time-in-state
+    return or_(AuditLog.previous_state.is_(None), AuditLog.previous_state != AuditLog.new_state)
+
+
+def load_transitions(db: Session, start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+    """
+    Load state-changing audit entries in [start, end) as column arrays, in keyset batches.
+    """
+    columns: Dict[str, List[Any]] = {"id": [], "ticket_id": [], "previous_state": [], "new_state": [], "actor": [], "timestamp": []}
+    last_id = 0
+    while True:
+        rows = (
+            db.query(AuditLog.id, AuditLog.ticket_id, AuditLog.previous_state, AuditLog.new_state, AuditLog.actor, AuditLog.timestamp)
+            .filter(AuditLog.id > last_id, AuditLog.timestamp >= start, AuditLog.timestamp < end, _state_changes())
+            .order_by(AuditLog.id)
+            .limit(LOAD_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        for name, values in zip(columns, zip(*rows)):
+            columns[name].extend(values)
+        last_id = rows[-1][0]
+
+    return {
+        "id": np.asarray(columns["id"], dtype=np.int64),
+        "ticket_id": np.asarray(columns["ticket_id"], dtype=np.int64),
+        "previous_state": np.asarray(columns["previous_state"], dtype=object),
+        "new_state": np.asarray(columns["new_state"], dtype=object),
+        "actor": np.asarray(columns["actor"], dtype=object),
+        "timestamp": np.asarray(columns["timestamp"], dtype="datetime64[us]"),
+    }
+
+
+def _entered_before(db: Session, ticket_ids: np.ndarray, start: datetime) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For tickets with transitions in the window, the time they entered their state before it.
+    Returns sorted ticket ids and matching timestamps.
+    """
+    found: List[Tuple[int, datetime]] = []
+    unique_ids = np.unique(ticket_ids).tolist()
+    for offset in range(0, len(unique_ids), 500):
+        chunk = unique_ids[offset:offset + 500]
+        found.extend(
+            db.query(AuditLog.ticket_id, func.max(AuditLog.timestamp))
+            .filter(AuditLog.ticket_id.in_(chunk), AuditLog.timestamp < start, _state_changes())
+            .group_by(AuditLog.ticket_id)
+            .all()
+        )
+    found.sort()
+    ids = np.asarray([ticket_id for ticket_id, _ in found], dtype=np.int64)
+    timestamps = np.asarray([ts for _, ts in found], dtype="datetime64[us]")
+    return ids, timestamps
+
+
+def compute_daily_rollups(db: Session, first_day: date, last_day: date) -> Dict[date, Dict[str, Any]]:
+    """
+    Compute per-day rollups for [first_day, last_day] with vectorized operations.
+
+    A state's duration is attributed to the day the ticket left it. Each day holds,
+    per state, a histogram over BUCKET_EDGES plus count and sum, and per reviewer the
+    number of RESOLVED and REJECTED decisions. Histograms are additive, so rollups of
+    any set of days can be merged before computing percentiles.
+    """
+    start = datetime.combine(first_day, datetime.min.time())
+    end = datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+    num_days = (last_day - first_day).days + 1
+    rollups: Dict[date, Dict[str, Any]] = {first_day + timedelta(days=i): {"states": {}, "reviewers": {}} for i in range(num_days)}
+
+    cols = load_transitions(db, start, end)
+    if len(cols["id"]) == 0:
+        return rollups
+
+    order = np.lexsort((cols["id"], cols["ticket_id"]))
+    ticket_ids = cols["ticket_id"][order]
+    timestamps = cols["timestamp"][order]
+    previous_states = cols["previous_state"][order]
+    new_states = cols["new_state"][order]
+    actors = cols["actor"][order]
+
+    # Entry time of the state being left: previous row of the same ticket, else the last one before the window
+    entered = np.empty_like(timestamps)
+    entered[1:] = timestamps[:-1]
+    first_of_ticket = np.ones(len(ticket_ids), dtype=bool)
+    first_of_ticket[1:] = ticket_ids[1:] != ticket_ids[:-1]
+    entered[first_of_ticket] = np.datetime64("NaT")
+    boundary_ids, boundary_ts = _entered_before(db, ticket_ids[first_of_ticket], start)
+    if len(boundary_ids):
+        positions = np.searchsorted(boundary_ids, ticket_ids)
+        positions = np.minimum(positions, len(boundary_ids) - 1)
+        matched = first_of_ticket & (boundary_ids[positions] == ticket_ids)
+        entered[matched] = boundary_ts[positions[matched]]
+
+    day_index = (timestamps.astype("datetime64[D]") - np.datetime64(first_day)).astype(np.int64)
+
+    valid = ~np.isnat(entered) & (previous_states != None)  # noqa: E711 - elementwise comparison
+    durations = (timestamps[valid] - entered[valid]).astype(np.float64) / 1e6
+    state_index = np.array([STATES.index(state) for state in previous_states[valid]], dtype=np.int64)
+    bucket_index = np.clip(np.searchsorted(BUCKET_EDGES, durations, side="right") - 1, 0, NUM_BUCKETS - 1)
+    cell = (day_index[valid] * len(STATES) + state_index)
+    histograms = np.bincount(cell * NUM_BUCKETS + bucket_index, minlength=num_days * len(STATES) * NUM_BUCKETS)
+    histograms = histograms.reshape(num_days, len(STATES), NUM_BUCKETS)
+    sums = np.bincount(cell, weights=durations, minlength=num_days * len(STATES)).reshape(num_days, len(STATES))
+    counts = histograms.sum(axis=2)
+
+    for d, s in zip(*np.nonzero(counts)):
+        rollups[first_day + timedelta(days=int(d))]["states"][STATES[s]] = {
+            "count": int(counts[d, s]),
+            "sum": float(sums[d, s]),
+            "hist": histograms[d, s].tolist(),
+        }
+
+    decided = np.isin(new_states, DECISION_STATES)
+    if decided.any():
+        reviewer_names, reviewer_index = np.unique(actors[decided].astype(str), return_inverse=True)
+        rejected = (new_states[decided] == TicketState.REJECTED).astype(np.int64)
+        key = (day_index[decided] * len(reviewer_names) + reviewer_index) * 2 + rejected
+        tallies = np.bincount(key, minlength=num_days * len(reviewer_names) * 2).reshape(num_days, len(reviewer_names), 2)
+        for d, r in zip(*np.nonzero(tallies.sum(axis=2))):
+            rollups[first_day + timedelta(days=int(d))]["reviewers"][str(reviewer_names[r])] = {
+                "resolved": int(tallies[d, r, 0]),
+                "rejected": int(tallies[d, r, 1]),
+            }
+
+    return rollups
+
+
+def get_daily_rollups(db: Session, first_day: date, last_day: date) -> Tuple[Dict[date, Dict[str, Any]], int]:
+    """
+    Return rollups for every day in the range, computing only days not already cached.
+    Each contiguous run of missing days is computed separately, so cached days in between
+    are never recomputed. A day is persisted once it ended more than
+    ROLLUP_CACHE_LAG_SECONDS ago: rows stamped with it may still be committed by
+    transactions open at midnight. Later days are recomputed on every request.
+    Returns the rollups and the number of days computed.
+    """
+    cached = {
+        rollup.day: rollup.payload
+        for rollup in db.query(LifecycleRollup).filter(LifecycleRollup.day >= first_day, LifecycleRollup.day <= last_day)
+    }
+    all_days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    missing = [day for day in all_days if day not in cached]
+    if not missing:
+        return cached, 0
+
+    runs: List[List[date]] = []
+    for day in missing:
+        if runs and day == runs[-1][-1] + timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    settled_before = datetime.utcnow() - timedelta(seconds=settings.ROLLUP_CACHE_LAG_SECONDS)
+    for run in runs:
+        computed = compute_daily_rollups(db, run[0], run[-1])
+        for day in run:
+            cached[day] = computed[day]
+            if datetime.combine(day + timedelta(days=1), datetime.min.time()) <= settled_before:
+                db.add(LifecycleRollup(day=day, payload=computed[day], computed_at=datetime.utcnow()))
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent refresh cached the same days first; its rollups are identical
+        db.rollback()
+    return cached, len(missing)
+
+
+def histogram_percentiles(hist: np.ndarray, quantiles: List[float]) -> List[float]:
+    """
+    Estimate quantiles (0-1) from a BUCKET_EDGES histogram by interpolating inside buckets.
+    """
+    cumulative = np.cumsum(hist)
+    total = cumulative[-1]
+    targets = np.asarray(quantiles) * total
+    index = np.clip(np.searchsorted(cumulative, targets, side="left"), 0, NUM_BUCKETS - 1)
+    below = np.where(index > 0, cumulative[np.maximum(index - 1, 0)], 0)
+    fraction = np.where(hist[index] > 0, (targets - below) / np.maximum(hist[index], 1), 0.0)
+    lower = BUCKET_EDGES[index]
+    upper = np.where(index + 1 < NUM_BUCKETS, BUCKET_EDGES[np.minimum(index + 1, NUM_BUCKETS - 1)], lower)
+    return (lower + fraction * (upper - lower)).tolist()
+
+
+def lifecycle_report(db: Session, first_day: date, last_day: date) -> Dict[str, Any]:
+    """
+    Merge daily rollups into time-in-state percentiles, per-reviewer rates and throughput.
+    With sharding, each shard computes and caches its own rollups and they are merged here.
+    """
+    shard_results = scatter_gather(db, lambda session: get_daily_rollups(session, first_day, last_day))
+    days_computed = max(computed for _, computed in shard_results)
+
+    hist = np.zeros((len(STATES), NUM_BUCKETS), dtype=np.int64)
+    sums = np.zeros(len(STATES))
+    reviewers: Dict[str, Dict[str, int]] = {}
+    daily: Dict[date, Dict[str, int]] = {}
+    for rollups, _ in shard_results:
+        for day, payload in rollups.items():
+            for state, stats in payload["states"].items():
+                s = STATES.index(state)
+                hist[s] += np.asarray(stats["hist"], dtype=np.int64)
+                sums[s] += stats["sum"]
+            day_totals = daily.setdefault(day, {"resolved": 0, "rejected": 0})
+            for actor, tally in payload["reviewers"].items():
+                totals = reviewers.setdefault(actor, {"resolved": 0, "rejected": 0})
+                totals["resolved"] += tally["resolved"]
+                totals["rejected"] += tally["rejected"]
+                day_totals["resolved"] += tally["resolved"]
+                day_totals["rejected"] += tally["rejected"]
+    throughput = [{"day": day, **daily[day]} for day in sorted(daily)]
+
+    time_in_state = {}
+    counts = hist.sum(axis=1)
+    for s, state in enumerate(STATES):
+        if counts[s] == 0:
+            continue
+        median, p95 = histogram_percentiles(hist[s], [0.5, 0.95])
+        time_in_state[state] = {
+            "count": int(counts[s]),
+            "mean_seconds": float(sums[s] / counts[s]),
+            "median_seconds": median,
+            "p95_seconds": p95,
+        }
+
+    reviewer_stats = {}
+    for actor, totals in sorted(reviewers.items()):
+        decided = totals["resolved"] + totals["rejected"]
+        reviewer_stats[actor] = {
+            **totals,
+            "total": decided,
+            "resolution_rate": totals["resolved"] / decided,
+            "rejection_ratio": totals["rejected"] / decided,
+        }
+
+    total_resolved = sum(day["resolved"] for day in throughput)
+    total_rejected = sum(day["rejected"] for day in throughput)
+    total_decided = total_resolved + total_rejected
+    return {
+        "date_start": first_day,
+        "date_end": last_day,
+        "time_in_state": time_in_state,
+        "reviewers": reviewer_stats,
+        "resolved": total_resolved,
+        "rejected": total_rejected,
+        "rejection_ratio": total_rejected / total_decided if total_decided else None,
+        "throughput": throughput,
+        "days_computed": days_computed,
+    }
@@ -0,0 +1,306 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.history import history_entry, serialize_state, ticket_state
+from app.models.ticket import Ticket, AuditLog, AuditCheckpoint, TicketSnapshot
+
+DEFAULT_VERIFY_BATCH_SIZE = 5000
+
+
+def compute_audit_hash(
+    prev_hash: Optional[str],
+    ticket_id: int,
+    actor: str,
+    action: str,
+    previous_state: Optional[str],
+    new_state: str,
+    reason: Optional[str],
+    metadata_info: Optional[Dict[str, Any]],
+    timestamp: datetime,
+    changes: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Hash an audit entry together with the hash of the previous entry of the same ticket.
+    The payload is canonical JSON so the hash is stable across databases and drivers.
+    """
+    fields = {
+        "prev_hash": prev_hash,
+        "ticket_id": ticket_id,
+        "actor": actor,
+        "action": action,
+        "previous_state": previous_state,
+        "new_state": new_state,
+        "reason": reason,
+        "metadata_info": metadata_info or {},
+        "timestamp": timestamp.isoformat(),
+    }
+    # Only hashed when present so entries written before field changes were recorded still verify
+    if changes is not None:
+        fields["changes"] = changes
+    payload = json.dumps(
+        fields,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def record_event(
+    db: Session,
+    ticket: Ticket,
+    actor: str,
+    action: str,
+    previous_state: Optional[str],
+    new_state: str,
+    reason: Optional[str] = None,
+    metadata_info: Optional[Dict[str, Any]] = None,
+    timestamp: Optional[datetime] = None,
+    changes: Optional[Dict[str, Any]] = None,
+) -> AuditLog:
+    """
+    Append an event to the ticket's history_log and its hash-chained AuditLog row.
+    `changes` lists the ticket fields the event set; the caller applies them to the
+    ticket beforehand. The ticket must already have an id (flush first on creation).
+    Does NOT commit.
+
+    The chain head is advanced with a compare-and-set on tickets.audit_hash, so a
+    concurrent writer that appended to the same ticket since it was loaded makes this
+    fail with 409 instead of forking the chain. Callers that load the ticket FOR
+    UPDATE only hit this on databases without row locks.
+    """
+    timestamp = timestamp or datetime.utcnow()
+    if changes is not None:
+        changes = serialize_state(changes)
+
+    entry_hash = compute_audit_hash(
+        ticket.audit_hash, ticket.id, actor, action, previous_state, new_state, reason, metadata_info, timestamp, changes
+    )
+    audit_entry = AuditLog(
+        ticket_id=ticket.id,
+        actor=actor,
+        action=action,
+        previous_state=previous_state,
+        new_state=new_state,
+        reason=reason,
+        metadata_info=metadata_info,
+        changes=changes,
+        timestamp=timestamp,
+        prev_hash=ticket.audit_hash,
+        entry_hash=entry_hash,
+    )
+    # The ticket row carries the head of its chain so appends never need to read audit_logs
+    advanced = db.execute(
+        update(Ticket)
+        .where(Ticket.id == ticket.id, Ticket.audit_hash.is_not_distinct_from(ticket.audit_hash))
+        .values(audit_hash=entry_hash)
+        .execution_options(synchronize_session=False)
+    )
+    if advanced.rowcount != 1:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"error": "Concurrent update", "reason": f"Ticket {ticket.id} was modified by another request; retry."},
+        )
+    ticket.audit_hash = entry_hash
+    db.add(audit_entry)
+
+    current_history = list(ticket.history_log) if ticket.history_log is not None else []
+    current_history.append(history_entry(audit_entry))
+    ticket.history_log = current_history
+
+    if len(current_history) % settings.SNAPSHOT_INTERVAL == 0:
+        db.add(TicketSnapshot(
+            ticket_id=ticket.id,
+            audit_log=audit_entry,
+            event_count=len(current_history),
+            taken_at=timestamp,
+            state=serialize_state(ticket_state(ticket, timestamp)),
+        ))
+    return audit_entry
+
+
+def _load_chain_heads(db: Session, ticket_ids: List[int], upto_id: int) -> Dict[int, Optional[str]]:
+    """
+    Return the entry_hash of the last audit row at or below upto_id for each ticket.
+    Tickets with no such row are omitted.
+    """
+    if not ticket_ids or upto_id <= 0:
+        return {}
+    last_ids = (
+        db.query(func.max(AuditLog.id))
+        .filter(AuditLog.ticket_id.in_(ticket_ids), AuditLog.id <= upto_id)
+        .group_by(AuditLog.ticket_id)
+    )
+    rows = db.query(AuditLog.ticket_id, AuditLog.entry_hash).filter(AuditLog.id.in_(last_ids.scalar_subquery())).all()
+    return {ticket_id: entry_hash for ticket_id, entry_hash in rows}
+
+
+def _check_chain_heads(
+    db: Session,
+    heads: Dict[int, Optional[str]],
+    last_rows: Dict[int, int],
+    full: bool,
+    batch_size: int,
+) -> List[Dict[str, Any]]:
+    """
+    Compare the last verified entry of each ticket with the chain head stored on the
+    ticket, which catches a chain whose tail was deleted. A full run also checks
+    tickets that have a chain head but no audit rows left.
+    """
+    stored: Dict[int, Optional[str]] = {}
+    if full:
+        for ticket_id, audit_hash in db.query(Ticket.id, Ticket.audit_hash).yield_per(batch_size):
+            stored[ticket_id] = audit_hash
+    else:
+        ticket_ids = list(heads)
+        for offset in range(0, len(ticket_ids), batch_size):
+            chunk = ticket_ids[offset:offset + batch_size]
+            stored.update(db.query(Ticket.id, Ticket.audit_hash).filter(Ticket.id.in_(chunk)).all())
+
+    mismatched = [ticket_id for ticket_id, audit_hash in stored.items() if audit_hash != heads.get(ticket_id)]
+    if not mismatched:
+        return []
+
+    # A ticket with rows newer than the ones verified was appended to during the run
+    latest = dict(
+        db.query(AuditLog.ticket_id, func.max(AuditLog.id))
+        .filter(AuditLog.ticket_id.in_(mismatched))
+        .group_by(AuditLog.ticket_id)
+        .all()
+    )
+    return [
+        {"audit_id": last_rows.get(ticket_id), "ticket_id": ticket_id, "error": "Chain head mismatch"}
+        for ticket_id in mismatched
+        if latest.get(ticket_id) is None or latest[ticket_id] <= last_rows.get(ticket_id, 0)
+    ]
+
+
+def verify_audit_chain(db: Session, full: bool = False, batch_size: int = DEFAULT_VERIFY_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Verify the per-ticket hash chains of audit_logs.
+
+    Verification resumes after the last checkpoint unless full=True, streaming rows in
+    id order with keyset batches. Chain heads for tickets first seen in a batch are read
+    from the already verified prefix. The last entry of every ticket seen must match the
+    chain head stored on the ticket.
+
+    The checkpoint advances even when failures are found: those up to it are stored
+    with it and reported again by every later incremental run, so one broken chain
+    does not force re-verifying everything after it. A full run starts over and
+    replaces them, which is how failures are cleared after a repair.
+
+    Serial ids are assigned at INSERT but rows only become visible at COMMIT, so a row
+    with a lower id can appear after a higher one was verified. The checkpoint therefore
+    stays at the last verified row older than AUDIT_CHECKPOINT_LAG_SECONDS; newer rows
+    are verified again by the next run.
+    """
+    checkpoint = None
+    if not full:
+        checkpoint = db.query(AuditCheckpoint).order_by(AuditCheckpoint.id.desc()).first()
+    start_id = checkpoint.last_audit_id if checkpoint else 0
+    known_failures: List[Dict[str, Any]] = list(checkpoint.failures or []) if checkpoint else []
+
+    heads: Dict[int, Optional[str]] = {}
+    last_rows: Dict[int, int] = {}
+    failures: List[Dict[str, Any]] = []
+    verified = 0
+    last_id = start_id
+    safe_id = start_id
+    safe_verified = 0
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.AUDIT_CHECKPOINT_LAG_SECONDS)
+
+    while True:
+        batch = (
+            db.query(AuditLog)
+            .filter(AuditLog.id > last_id)
+            .order_by(AuditLog.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+
+        unseen = list({row.ticket_id for row in batch if row.ticket_id not in heads})
+        known = _load_chain_heads(db, unseen, start_id)
+        for ticket_id in unseen:
+            heads[ticket_id] = known.get(ticket_id)
+
+        for row in batch:
+            expected_prev = heads[row.ticket_id]
+            last_rows[row.ticket_id] = row.id
+            if row.entry_hash is None:
+                # Rows written before chaining was introduced cannot be verified; the chain restarts after them
+                heads[row.ticket_id] = None
+                verified += 1
+                if row.timestamp is not None and row.timestamp <= cutoff:
+                    safe_id, safe_verified = row.id, verified
+                continue
+
+            recomputed = compute_audit_hash(
+                row.prev_hash, row.ticket_id, row.actor, row.action, row.previous_state,
+                row.new_state, row.reason, row.metadata_info, row.timestamp, row.changes
+            )
+            if row.prev_hash != expected_prev:
+                failures.append({"audit_id": row.id, "ticket_id": row.ticket_id, "error": "Chain link mismatch"})
+            elif recomputed != row.entry_hash:
+                failures.append({"audit_id": row.id, "ticket_id": row.ticket_id, "error": "Entry hash mismatch"})
+
+            heads[row.ticket_id] = row.entry_hash
+            verified += 1
+            if row.timestamp is not None and row.timestamp <= cutoff:
+                safe_id, safe_verified = row.id, verified
+
+        last_id = batch[-1].id
+        # Keep the identity map from growing with the table
+        db.expunge_all()
+
+    failures.extend(_check_chain_heads(db, heads, last_rows, full, batch_size))
+
+    # Failures past the new checkpoint are found again by the next run
+    failures = known_failures + [failure for failure in failures if failure not in known_failures]
+    checkpoint_id = start_id
+    if safe_id > start_id:
+        settled = [failure for failure in failures if failure["audit_id"] is None or failure["audit_id"] <= safe_id]
+        db.add(AuditCheckpoint(last_audit_id=safe_id, rows_verified=safe_verified, verified_at=datetime.utcnow(), failures=settled))
+        db.commit()
+        checkpoint_id = safe_id
+
+    return {
+        "valid": not failures,
+        "full": full,
+        "resumed_from": start_id,
+        "last_audit_id": last_id,
+        "checkpoint": checkpoint_id,
+        "rows_verified": verified,
+        "failures": failures,
+    }
+
+
+def merge_verification_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine per-shard verification reports. Audit ids are shard-local, so with more
+    than one shard the checkpoint positions are only reported per shard.
+    """
+    if len(reports) == 1:
+        return reports[0]
+
+    failures = []
+    shards = []
+    for shard, report in enumerate(reports):
+        failures.extend({**failure, "shard": shard} for failure in report["failures"])
+        shards.append({key: value for key, value in report.items() if key != "failures"} | {"shard": shard})
+    return {
+        "valid": not failures,
+        "full": reports[0]["full"],
+        "resumed_from": None,
+        "last_audit_id": None,
+        "checkpoint": None,
+        "rows_verified": sum(report["rows_verified"] for report in reports),
+        "failures": failures,
+        "shards": shards,
+    }
@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextvars import copy_context
+from typing import Callable, Optional, TypeVar
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.config import settings
+from app.core.db import SessionLocal
+
+T = TypeVar("T")
+
+
+class GroupCommitter:
+    """
+    Coalesces concurrent write requests into a single database transaction.
+
+    Work items submitted within `window_ms` of the first one in a batch run one after
+    another on a single worker thread and session, each inside its own SAVEPOINT, so a
+    failing item (e.g. an invalid FSM transition) is rolled back alone and gets its own
+    error. The batch is committed once; callers only get their result after that commit
+    succeeds, and every caller of a batch whose commit fails gets the commit error.
+    Items run in submission order, so transitions on the same ticket keep their order.
+
+    The coalescing is aimed at PostgreSQL. pysqlite does not open a transaction before
+    the first SAVEPOINT, so on SQLite each item is still committed on its own.
+    """
+
+    def __init__(self, session_factory: sessionmaker, window_ms: float, max_batch: int = 128):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, work: Callable[[Session], T]) -> T:
+        """
+        Run work(session) in the next group transaction and block until it is committed.
+        work must not commit; it should flush and return a value usable after the session closes.
+        """
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((work, future, copy_context()))
+        return future.result()
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            # Also replaces a worker that died, so queued and later items are not stranded
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._commit_batch(batch)
+            except BaseException as exc:
+                # Keep the worker alive: fail whichever callers of the batch are still waiting
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                if not isinstance(exc, Exception):
+                    raise
+            if stop:
+                return
+
+    def _commit_batch(self, batch) -> None:
+        db = self.session_factory()
+        succeeded = []
+        try:
+            for work, future, context in batch:
+                savepoint = db.begin_nested()
+                try:
+                    result = context.run(work, db)
+                    savepoint.commit()
+                except Exception as exc:
+                    savepoint.rollback()
+                    future.set_exception(exc)
+                else:
+                    succeeded.append((future, result))
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            # Nothing from this batch was committed; fail every caller still waiting
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for future, result in succeeded:
+                future.set_result(result)
+        finally:
+            db.close()
+
+
+_group_committer: Optional[GroupCommitter] = None
+_group_committer_lock = threading.Lock()
+
+
+def get_group_committer() -> Optional[GroupCommitter]:
+    """
+    Dependency returning the shared GroupCommitter, or None when GROUP_COMMIT_WINDOW_MS is 0.
+    """
+    global _group_committer
+    if settings.GROUP_COMMIT_WINDOW_MS <= 0:
+        return None
+    with _group_committer_lock:
+        if _group_committer is None:
+            _group_committer = GroupCommitter(SessionLocal, settings.GROUP_COMMIT_WINDOW_MS, settings.GROUP_COMMIT_MAX_BATCH)
+    return _group_committer
@@ -1,19 +1,35 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
+from app.core.tracing import span
 
-# If running SQLite, we need check_same_thread=False
-connect_args = {"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-
-engine = create_engine(
-    settings.DATABASE_URL, connect_args=connect_args
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def create_db_engine(url: str):
+    # If running SQLite, we need check_same_thread=False
+    connect_args = {"check_same_thread": False} if "sqlite" in url else {}
+    return create_engine(url, connect_args=connect_args)
 
 Base = declarative_base()
 
+SHARD_URLS = [url.strip() for url in settings.SHARD_URLS.split(",") if url.strip()]
+
+if SHARD_URLS:
+    from app.core.sharding import ShardRouter
+
+    shard_router = ShardRouter([create_db_engine(url) for url in SHARD_URLS], legacy_max_id=settings.SHARD_LEGACY_MAX_ID)
+    engine = shard_router.engines[0]
+    SessionLocal = shard_router.session_factory()
+else:
+    shard_router = None
+    engine = create_db_engine(settings.DATABASE_URL)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
 def get_db():
-    db = SessionLocal()
+    with span("get_db") as traced:
+        db = SessionLocal()
+        # The session checks out its connection lazily, so take it here for the span to time
+        # the pool checkout. A sharded session picks its engine per statement and is left alone.
+        if traced is not None and shard_router is None:
+            db.connection()
     try:
         yield db
     finally:
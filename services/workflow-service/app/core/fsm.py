@@ -1,8 +1,9 @@
 from typing import Any, Dict, Optional
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
-from app.models.ticket import Ticket, AuditLog
-from datetime import datetime
+from app.models.ticket import Ticket
+from app.core.audit import record_event
+from app.core.tracing import span
 
 class TicketState:
     CREATED = "CREATED"
@@ -39,45 +40,32 @@ class TicketStateMachine:
                 }
             )
 
-    def transition(self, ticket: Ticket, new_state: str, actor: str, action: str, reason: Optional[str] = None, metadata_info: Optional[Dict[str, Any]] = None) -> Ticket:
+    def transition(self, ticket: Ticket, new_state: str, actor: str, action: str, reason: Optional[str] = None, metadata_info: Optional[Dict[str, Any]] = None, changes: Optional[Dict[str, Any]] = None) -> Ticket:
         """
         Transition a ticket to a new state and record the history atomically within the session.
+        `changes` are additional ticket fields set by the transition (e.g. the resolution).
         Does NOT commit. The caller must commit the transaction.
         """
-        self.validate_transition(ticket.status, new_state)
+        with span("fsm.transition", ticket_id=ticket.id, from_state=ticket.status, to_state=new_state):
+            self.validate_transition(ticket.status, new_state)
 
-        previous_state = ticket.status
-        ticket.status = new_state
-        
-        timestamp = datetime.utcnow()
-        timestamp_iso = timestamp.isoformat()
+            previous_state = ticket.status
+            ticket.status = new_state
+            for field, value in (changes or {}).items():
+                setattr(ticket, field, value)
 
-        # Build history log entry
-        log_entry = {
-            "action": action,
-            "actor": actor,
-            "previous_state": previous_state,
-            "new_state": new_state,
-            "reason": reason,
-            "timestamp": timestamp_iso
-        }
-        
-        # We need to append to the JSON array or assign a new list if it's None/empty
-        current_history = list(ticket.history_log) if ticket.history_log is not None else []
-        current_history.append(log_entry)
-        ticket.history_log = current_history
+            # History entry and hash-chained global audit log insertion
+            record_event(
+                self.db,
+                ticket,
+                actor=actor,
+                action=action,
+                previous_state=previous_state,
+                new_state=new_state,
+                reason=reason,
+                metadata_info=metadata_info or {},
+                # Always recorded, so a null `changes` marks entries written before fields were tracked
+                changes=changes or {}
+            )
 
-        # Global audit log insertion
-        audit_entry = AuditLog(
-            ticket_id=ticket.id,
-            actor=actor,
-            action=action,
-            previous_state=previous_state,
-            new_state=new_state,
-            reason=reason,
-            metadata_info=metadata_info or {},
-            timestamp=timestamp
-        )
-        self.db.add(audit_entry)
-        
         return ticket
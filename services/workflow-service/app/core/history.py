@@ -0,0 +1,202 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.ticket import Ticket, AuditLog, TicketSnapshot
+
+# Ticket fields that change over the lifecycle and are replayed from the audit trail
+MUTABLE_FIELDS = ("status", "assigned_to", "resolution", "resolved_by", "resolved_at", "updated_at")
+# Ticket columns returned by the API besides the history
+TICKET_FIELDS = (
+    "id", "source_query", "agent_decision", "confidence_score", "escalation_reason", "created_at", "duplicate_of",
+) + MUTABLE_FIELDS
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Stored timestamps are naive UTC; convert timezone-aware inputs to match them.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def serialize_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Make a field dict JSON-safe for storage in audit changes and snapshots.
+    """
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in state.items()}
+
+
+def history_entry(row: AuditLog) -> Dict[str, Any]:
+    """
+    The history_log entry matching an audit row.
+    """
+    return {
+        "action": row.action,
+        "actor": row.actor,
+        "previous_state": row.previous_state,
+        "new_state": row.new_state,
+        "reason": row.reason,
+        "timestamp": row.timestamp.isoformat()
+    }
+
+
+def recent_histories(db: Session, ticket_ids: List[int], limit: int) -> Dict[int, Tuple[List[Dict[str, Any]], int]]:
+    """
+    The last `limit` history entries of each ticket, oldest first, and its total entry count.
+    Read from the indexed audit_logs table so the tickets' full history_log is never loaded;
+    two queries regardless of how many tickets are requested.
+    """
+    if not ticket_ids:
+        return {}
+    counts = dict(
+        db.query(AuditLog.ticket_id, func.count(AuditLog.id))
+        .filter(AuditLog.ticket_id.in_(ticket_ids))
+        .group_by(AuditLog.ticket_id)
+        .all()
+    )
+    histories: Dict[int, Tuple[List[Dict[str, Any]], int]] = {ticket_id: ([], counts.get(ticket_id, 0)) for ticket_id in ticket_ids}
+    if limit <= 0:
+        return histories
+
+    ranked = (
+        db.query(
+            AuditLog.id.label("id"),
+            func.row_number().over(partition_by=AuditLog.ticket_id, order_by=AuditLog.id.desc()).label("rank"),
+        )
+        .filter(AuditLog.ticket_id.in_(ticket_ids))
+        .subquery()
+    )
+    rows = (
+        db.query(AuditLog)
+        .join(ranked, ranked.c.id == AuditLog.id)
+        .filter(AuditLog.ticket_id.in_(ticket_ids), ranked.c.rank <= limit)
+        .order_by(AuditLog.id)
+        .all()
+    )
+    for row in rows:
+        histories[row.ticket_id][0].append(history_entry(row))
+    return histories
+
+
+def recent_history(db: Session, ticket_id: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    return recent_histories(db, [ticket_id], limit)[ticket_id]
+
+
+def embed_recent_history(db: Session, tickets: List[Ticket], limit: int) -> List[Dict[str, Any]]:
+    """
+    Tickets as response dicts whose history_log holds only the last `limit` entries,
+    with `history_count` giving the total. Load the tickets with history_log deferred
+    where possible; it is never read here.
+    """
+    histories = recent_histories(db, [ticket.id for ticket in tickets], limit)
+    responses = []
+    for ticket in tickets:
+        history, total = histories[ticket.id]
+        responses.append({
+            **{field: getattr(ticket, field) for field in TICKET_FIELDS},
+            "history_log": history,
+            "history_count": total,
+        })
+    return responses
+
+
+def ticket_state(ticket: Ticket, timestamp: datetime) -> Dict[str, Any]:
+    """
+    Current mutable state of a ticket as of an event recorded at `timestamp`.
+    """
+    state = {field: getattr(ticket, field) for field in MUTABLE_FIELDS}
+    state["updated_at"] = timestamp
+    return state
+
+
+def _apply_event(state: Dict[str, Any], row: AuditLog) -> None:
+    state["status"] = row.new_state
+    if row.changes:
+        state.update(row.changes)
+    state["updated_at"] = row.timestamp
+
+
+def reconstruct_tickets(db: Session, tickets: List[Ticket], as_of: datetime) -> Dict[int, Dict[str, Any]]:
+    """
+    Rebuild the state of many tickets as it was at `as_of`.
+
+    Uses a fixed number of queries regardless of how many tickets are requested: one
+    for the latest snapshot per ticket taken at or before `as_of` and one for the audit
+    entries recorded after that snapshot. Tickets created after `as_of` are omitted.
+
+    Audit entries written before field changes were recorded have null `changes`. For
+    tickets with such entries, fields the replay could not determine fall back to the
+    ticket's columns: exactly when the ticket has no events after `as_of`, otherwise
+    only `assigned_to`, whose current value is then a best-effort approximation.
+    """
+    tickets = [ticket for ticket in tickets if ticket.created_at is not None and ticket.created_at <= as_of]
+    ticket_ids = [ticket.id for ticket in tickets]
+    if not ticket_ids:
+        return {}
+
+    latest_snapshot_ids = (
+        db.query(func.max(TicketSnapshot.id))
+        .filter(TicketSnapshot.ticket_id.in_(ticket_ids), TicketSnapshot.taken_at <= as_of)
+        .group_by(TicketSnapshot.ticket_id)
+    )
+    snapshots = {
+        snapshot.ticket_id: snapshot
+        for snapshot in db.query(TicketSnapshot).filter(TicketSnapshot.id.in_(latest_snapshot_ids.scalar_subquery()))
+    }
+
+    # Only the suffix after each ticket's snapshot is replayed
+    snapshot_cutoff = (
+        db.query(func.max(TicketSnapshot.audit_log_id))
+        .filter(TicketSnapshot.ticket_id == AuditLog.ticket_id, TicketSnapshot.taken_at <= as_of)
+        .correlate(AuditLog)
+        .scalar_subquery()
+    )
+    events = (
+        db.query(AuditLog)
+        .filter(
+            AuditLog.ticket_id.in_(ticket_ids),
+            AuditLog.timestamp <= as_of,
+            AuditLog.id > func.coalesce(snapshot_cutoff, 0),
+        )
+        .order_by(AuditLog.ticket_id, AuditLog.id)
+        .all()
+    )
+
+    states: Dict[int, Dict[str, Any]] = {}
+    event_counts: Dict[int, int] = {}
+    for ticket_id in ticket_ids:
+        snapshot: Optional[TicketSnapshot] = snapshots.get(ticket_id)
+        states[ticket_id] = dict(snapshot.state) if snapshot else {field: None for field in MUTABLE_FIELDS}
+        event_counts[ticket_id] = snapshot.event_count if snapshot else 0
+    legacy = set()
+    for row in events:
+        _apply_event(states[row.ticket_id], row)
+        event_counts[row.ticket_id] += 1
+        if row.changes is None:
+            legacy.add(row.ticket_id)
+
+    results = {}
+    for ticket in tickets:
+        state = states[ticket.id]
+        if ticket.id in legacy:
+            # Every event of the ticket was replayed, so its columns are still the state at as_of
+            unchanged_since = len(ticket.history_log or []) == event_counts[ticket.id]
+            for field in (MUTABLE_FIELDS if unchanged_since else ("assigned_to",)):
+                if state[field] is None:
+                    state[field] = getattr(ticket, field)
+        results[ticket.id] = {
+            "id": ticket.id,
+            "source_query": ticket.source_query,
+            "agent_decision": ticket.agent_decision,
+            "confidence_score": ticket.confidence_score,
+            "escalation_reason": ticket.escalation_reason,
+            "created_at": ticket.created_at,
+            "duplicate_of": ticket.duplicate_of,
+            **state,
+            "status": state["status"] or ticket.status,
+            "updated_at": state["updated_at"] or ticket.created_at,
+            "history_log": list(ticket.history_log or [])[:event_counts[ticket.id]],
+        }
+    return results
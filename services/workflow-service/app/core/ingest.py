@@ -0,0 +1,177 @@
+from typing import Any, AsyncIterator, Dict, List, Tuple, Union
+import msgpack
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.core.audit import record_event
+from app.core.fsm import TicketState
+from app.core.similarity import index_tickets
+from app.models.ticket import Ticket
+from app.schemas.ticket import TicketCreate
+
+# Frames are a 4-byte big-endian length followed by one MessagePack-encoded TicketCreate map
+FRAME_HEADER_BYTES = 4
+MAX_FRAME_BYTES = 1024 * 1024
+
+_TICKETS = TypeAdapter(List[TicketCreate])
+
+
+class FrameError(ValueError):
+    pass
+
+
+def create_tickets(db: Session, tickets_in: List[TicketCreate]) -> List[Tuple[Ticket, bool]]:
+    """
+    Create many tickets with the same idempotency rule as create_ticket. Does NOT commit.
+
+    One query finds existing CREATED tickets for all source queries and the new tickets
+    are inserted in a single flush, then linked to likely duplicates through the LSH
+    index. Returns (ticket, created) for each input, in order;
+    repeated source queries within the batch resolve to the same ticket.
+    """
+    queries = list(dict.fromkeys(ticket_in.source_query for ticket_in in tickets_in))
+    by_query: Dict[str, Ticket] = {}
+    for ticket in (
+        db.query(Ticket)
+        .filter(Ticket.source_query.in_(queries), Ticket.status == TicketState.CREATED)
+        .order_by(Ticket.id)
+    ):
+        by_query.setdefault(ticket.source_query, ticket)
+
+    results: List[Tuple[Ticket, bool]] = []
+    new_tickets: List[Ticket] = []
+    for ticket_in in tickets_in:
+        ticket = by_query.get(ticket_in.source_query)
+        if ticket is not None:
+            results.append((ticket, False))
+            continue
+        ticket = Ticket(
+            source_query=ticket_in.source_query,
+            agent_decision=ticket_in.agent_decision,
+            confidence_score=ticket_in.confidence_score,
+            escalation_reason=ticket_in.escalation_reason,
+            assigned_to=ticket_in.assigned_to,
+            status=TicketState.CREATED
+        )
+        by_query[ticket_in.source_query] = ticket
+        new_tickets.append(ticket)
+        results.append((ticket, True))
+
+    if new_tickets:
+        db.add_all(new_tickets)
+        db.flush()
+        # Creation is not a transition, so the initial history/audit entry is recorded directly
+        for ticket in new_tickets:
+            record_event(
+                db,
+                ticket,
+                actor="system",
+                action="CREATE",
+                previous_state=None,
+                new_state=TicketState.CREATED,
+                reason="Initial escalation creation",
+                changes={"assigned_to": ticket.assigned_to}
+            )
+        index_tickets(db, new_tickets)
+    return results
+
+
+async def iter_frames(chunks: AsyncIterator[bytes], max_frame_bytes: int = MAX_FRAME_BYTES) -> AsyncIterator[Union[bytes, FrameError]]:
+    """
+    Split a length-prefixed byte stream into frame payloads.
+
+    Oversized frames are skipped and yielded as a FrameError so the stream stays in
+    sync; a stream that ends inside a frame yields a final FrameError.
+    """
+    buffer = bytearray()
+    skip = 0
+    async for chunk in chunks:
+        buffer += chunk
+        offset = 0
+        while True:
+            if skip:
+                dropped = min(skip, len(buffer) - offset)
+                offset += dropped
+                skip -= dropped
+                if skip:
+                    break
+            if len(buffer) - offset < FRAME_HEADER_BYTES:
+                break
+            size = int.from_bytes(buffer[offset:offset + FRAME_HEADER_BYTES], "big")
+            if size > max_frame_bytes:
+                offset += FRAME_HEADER_BYTES
+                skip = size
+                yield FrameError(f"Frame of {size} bytes exceeds the {max_frame_bytes} byte limit")
+                continue
+            end = offset + FRAME_HEADER_BYTES + size
+            if len(buffer) < end:
+                break
+            yield bytes(buffer[offset + FRAME_HEADER_BYTES:end])
+            offset = end
+        # Compact once per chunk rather than once per frame
+        del buffer[:offset]
+    if buffer or skip:
+        yield FrameError("Stream ended inside a frame")
+
+
+def _invalid(index: int, error: str) -> Dict[str, Any]:
+    return {"index": index, "status": "invalid", "error": error}
+
+
+def decode_tickets(frames: List[Tuple[int, Union[bytes, FrameError]]]) -> Tuple[List[Tuple[int, TicketCreate]], List[Dict[str, Any]]]:
+    """
+    Decode a batch of frames and validate the records with a single TypeAdapter call.
+    Returns the valid (index, record) pairs and the acks of invalid frames, whose
+    errors are client-facing messages.
+    """
+    records: List[Tuple[int, Dict[str, Any]]] = []
+    invalid: List[Dict[str, Any]] = []
+    for index, frame in frames:
+        if isinstance(frame, FrameError):
+            invalid.append(_invalid(index, str(frame)))
+            continue
+        try:
+            record: Any = msgpack.unpackb(frame, raw=False)
+        except ValueError as e:
+            invalid.append(_invalid(index, f"Invalid MessagePack: {e}"))
+            continue
+        if not isinstance(record, dict):
+            invalid.append(_invalid(index, "Record must be a MessagePack map"))
+            continue
+        records.append((index, record))
+
+    try:
+        tickets_in = _TICKETS.validate_python([record for _, record in records])
+    except ValidationError as e:
+        # Error locations start with the record's position in the batch
+        messages: Dict[int, List[str]] = {}
+        for error in e.errors():
+            position, *loc = error["loc"]
+            messages.setdefault(position, []).append(f"{'.'.join(str(part) for part in loc)}: {error['msg']}")
+        invalid.extend(_invalid(records[position][0], "; ".join(errors)) for position, errors in messages.items())
+        records = [record for position, record in enumerate(records) if position not in messages]
+        tickets_in = _TICKETS.validate_python([record for _, record in records])
+    return [(index, ticket_in) for (index, _), ticket_in in zip(records, tickets_in)], invalid
+
+
+def ingest_batch(db: Session, frames: List[Tuple[int, Union[bytes, FrameError]]]) -> List[Dict[str, Any]]:
+    """
+    Decode and validate a batch of frames, insert the valid records in one transaction
+    and return the acks of every frame. Runs in the threadpool, off the event loop.
+    If the transaction fails, every valid record of the batch is acked as failed.
+    """
+    batch, acks = decode_tickets(frames)
+    if not batch:
+        return acks
+    try:
+        results = create_tickets(db, [ticket_in for _, ticket_in in batch])
+        # Read ids before commit expires the tickets
+        created_acks = [
+            {"index": index, "status": "created" if created else "duplicate", "id": ticket.id}
+            for (index, _), (ticket, created) in zip(batch, results)
+        ]
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        return acks + [{"index": index, "status": "failed", "error": "Database failure; batch was not stored"} for index, _ in batch]
+    return acks + created_acks
@@ -0,0 +1,241 @@
+import hashlib
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, TypeVar
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Query, Session, sessionmaker
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BindParameter, ColumnElement
+
+T = TypeVar("T")
+
+# Ticket ids encode their shard as `id % SHARD_SPACE`, so routing by id never needs a
+# lookup. Tickets created before sharding was enabled (ids up to `legacy_max_id`) were
+# numbered by the first database's own sequence and stay on shard 0; minted ids are
+# always above that cutoff. New tickets are placed by a hash of their source_query over
+# the current number of shards, so adding a shard later moves where the create_ticket
+# idempotency check looks and can duplicate open tickets created before it.
+SHARD_SPACE = 64
+ID_BLOCK_SIZE = 1000
+
+
+def shard_for_ticket(ticket_id: int, legacy_max_id: int = 0) -> int:
+    if ticket_id <= legacy_max_id:
+        return 0
+    return ticket_id % SHARD_SPACE
+
+
+def shard_for_source_query(source_query: str, num_shards: int) -> int:
+    """
+    Shard that new tickets with this source_query are placed on. Keeping identical
+    queries together lets the create_ticket idempotency check read a single shard.
+    """
+    digest = hashlib.sha1(source_query.encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % num_shards
+
+
+class IdBlockAllocator:
+    """
+    Hands out globally unique ticket ids for one shard without talking to other shards.
+
+    Blocks of ID_BLOCK_SIZE local sequence numbers are reserved from the shard's own
+    id_blocks row in a short separate transaction; ids inside a block are minted in
+    memory as `local * SHARD_SPACE + shard`, with local numbers offset past `min_id`.
+    """
+
+    def __init__(self, engine: Engine, shard: int, name: str = "tickets", min_id: int = 0):
+        self.engine = engine
+        self.shard = shard
+        self.name = name
+        self._local_offset = min_id // SHARD_SPACE
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+
+    def _reserve_block(self) -> int:
+        while True:
+            with self.engine.begin() as conn:
+                updated = conn.execute(
+                    text("UPDATE id_blocks SET next_block = next_block + 1 WHERE name = :name"), {"name": self.name}
+                )
+                if updated.rowcount:
+                    return conn.execute(
+                        text("SELECT next_block FROM id_blocks WHERE name = :name"), {"name": self.name}
+                    ).scalar_one() - 1
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(text("INSERT INTO id_blocks (name, next_block) VALUES (:name, 1)"), {"name": self.name})
+                return 0
+            except IntegrityError:
+                # Another process created the row first; reserve through the UPDATE path
+                continue
+
+    def allocate(self) -> int:
+        with self._lock:
+            if self._next >= self._limit:
+                block = self._reserve_block()
+                # Local sequence numbers start at 1 so no ticket id is 0
+                self._next = block * ID_BLOCK_SIZE + 1
+                self._limit = self._next + ID_BLOCK_SIZE
+            local = self._next
+            self._next += 1
+        return (local + self._local_offset) * SHARD_SPACE + self.shard
+
+
+def _ticket_criteria(statement: Any) -> Iterable[Any]:
+    """
+    Yield (kind, values) for `tickets.id`, `*.ticket_id` and `tickets.source_query`
+    equality / IN comparisons found in a statement.
+
+    Like SQLAlchemy's own sharding example this assumes such criteria are ANDed with
+    the rest of the WHERE clause, which holds for every query in this service.
+    """
+    found = []
+
+    def visit_binary(binary):
+        column, value = binary.left, binary.right
+        if not isinstance(column, ColumnElement) or not isinstance(value, BindParameter):
+            return
+        table = getattr(column, "table", None)
+        table_name = getattr(table, "name", None)
+        if column.key == "ticket_id" or (table_name == "tickets" and column.key == "id"):
+            kind = "ticket_id"
+        elif table_name == "tickets" and column.key == "source_query":
+            kind = "source_query"
+        else:
+            return
+
+        bound = value.effective_value
+        if binary.operator == operators.eq and bound is not None:
+            found.append((kind, [bound]))
+        elif binary.operator == operators.in_op and bound is not None:
+            found.append((kind, list(bound)))
+
+    visitors.traverse(statement, {}, {"binary": visit_binary})
+    return found
+
+
+class ShardRouter:
+    """
+    Routes tickets and their audit rows to one of N databases.
+
+    Tickets, audit_logs and ticket_snapshots rows live on the shard encoded in the
+    ticket id. Queries filtered by ticket id (or source_query) go to the matching
+    shards only; anything else fans out. Listing and statistics use scatter_gather,
+    which runs per-shard queries in parallel with their own sessions.
+
+    When sharding an existing database, it must be the first engine and
+    `legacy_max_id` its highest ticket id at the time: those tickets keep routing
+    to it whatever their `id % SHARD_SPACE`.
+    """
+
+    def __init__(self, engines: List[Engine], legacy_max_id: int = 0):
+        if len(engines) > SHARD_SPACE:
+            raise ValueError(f"At most {SHARD_SPACE} shards are supported")
+        self.engines: Dict[int, Engine] = dict(enumerate(engines))
+        self.legacy_max_id = legacy_max_id
+        self.allocators = {
+            shard: IdBlockAllocator(engine, shard, min_id=legacy_max_id) for shard, engine in self.engines.items()
+        }
+        self._executor = ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix="shard")
+
+    def shard_for_ticket(self, ticket_id: int) -> int:
+        return shard_for_ticket(ticket_id, self.legacy_max_id)
+
+    # ShardedSession hooks
+
+    def shard_chooser(self, mapper, instance, clause=None):
+        if instance is not None:
+            if mapper is not None and mapper.local_table.name == "tickets" and instance.id is not None:
+                return self.shard_for_ticket(instance.id)
+            ticket_id = getattr(instance, "ticket_id", None)
+            if ticket_id is not None:
+                return self.shard_for_ticket(ticket_id)
+        # Shard-local bookkeeping tables are written through per-shard sessions; default to the first shard
+        return 0
+
+    def identity_chooser(self, mapper, primary_key, **kw):
+        if mapper.local_table.name == "tickets":
+            # Ids from outside this deployment may encode a shard that does not exist
+            shard = self.shard_for_ticket(primary_key[0])
+            return [shard] if shard in self.engines else []
+        return list(self.engines)
+
+    def execute_chooser(self, context):
+        shards: Set[int] = set()
+        for kind, values in _ticket_criteria(context.statement):
+            if kind == "ticket_id":
+                shards.update(self.shard_for_ticket(int(value)) for value in values)
+            else:
+                shards.update(shard_for_source_query(value, len(self.engines)) for value in values)
+                if self.legacy_max_id:
+                    # Tickets created before sharding may hold any source_query
+                    shards.add(0)
+        shards &= set(self.engines)
+        return sorted(shards) if shards else list(self.engines)
+
+    def _assign_ticket_ids(self, session, flush_context, instances):
+        for obj in session.new:
+            if obj.__table__.name == "tickets" and obj.id is None:
+                shard = shard_for_source_query(obj.source_query, len(self.engines))
+                obj.id = self.allocators[shard].allocate()
+
+    def session_factory(self) -> sessionmaker:
+        factory = sessionmaker(
+            class_=ShardedSession,
+            autoflush=False,
+            shards=self.engines,
+            shard_chooser=self.shard_chooser,
+            identity_chooser=self.identity_chooser,
+            execute_chooser=self.execute_chooser,
+            info={"shard_router": self},
+        )
+        event.listen(factory, "before_flush", self._assign_ticket_ids)
+        return factory
+
+    # Scatter-gather
+
+    def map(self, fn: Callable[[Session], T]) -> List[T]:
+        """
+        Run fn once per shard in parallel, each call with its own plain session.
+        """
+        def run(engine: Engine) -> T:
+            with Session(bind=engine, autoflush=False) as session:
+                return fn(session)
+
+        futures = [self._executor.submit(copy_context().run, run, engine) for engine in self.engines.values()]
+        return [future.result() for future in futures]
+
+
+def get_router(db: Session) -> Optional[ShardRouter]:
+    return db.info.get("shard_router")
+
+
+def scatter_gather(db: Session, fn: Callable[[Session], T]) -> List[T]:
+    """
+    Run fn against every shard behind db and return the per-shard results.
+    Without sharding this is simply [fn(db)].
+    """
+    router = get_router(db)
+    if router is None:
+        return [fn(db)]
+    return router.map(fn)
+
+
+def scatter_page(db: Session, build_query: Callable[[Session], Query], key: Callable[[Any], Any], skip: int, limit: int, reverse: bool = False) -> List[Any]:
+    """
+    Paginate an ordered query across shards.
+
+    build_query must apply the ordering that `key` (and `reverse`) describe. Each shard
+    returns its first skip + limit rows and the pages are merged in sort order.
+    """
+    if get_router(db) is None:
+        return build_query(db).offset(skip).limit(limit).all()
+    pages = scatter_gather(db, lambda session: build_query(session).limit(skip + limit).all())
+    return list(islice(heapq.merge(*pages, key=key, reverse=reverse), skip, skip + limit))
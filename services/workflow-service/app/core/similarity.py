@@ -0,0 +1,179 @@
+import hashlib
+import random
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.ticket import Ticket, TicketSignature, TicketLshBucket
+
+# MinHash over the word set of a normalized source_query, split into LSH bands.
+# 16 bands of 4 rows make tickets with ~50% word overlap likely to share a bucket.
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // LSH_BANDS
+# Per-bucket selects combined into one statement; SQLite allows 500 compound SELECT terms
+BUCKETS_PER_QUERY = 100
+
+_PRIME = (1 << 31) - 1
+# Persisted signatures depend on these coefficients, so the seed must never change
+_rng = random.Random(0x5EED)
+_A = np.array([_rng.randrange(1, _PRIME) for _ in range(NUM_PERMUTATIONS)], dtype=np.uint64)
+_B = np.array([_rng.randrange(0, _PRIME) for _ in range(NUM_PERMUTATIONS)], dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(_WORD.findall(text.casefold()))
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """
+    MinHash signature of the query's distinct words, or None if it has no words.
+    """
+    words = set(normalize_query(text).split())
+    if not words:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "big") for word in words),
+        dtype=np.uint64,
+        count=len(words),
+    )
+    # a < 2**31 and hash < 2**32, so the products cannot overflow uint64
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1).astype("<u4")
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """
+    One 63-bit bucket key per LSH band; the band number is part of the key.
+    """
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        digest = hashlib.blake2b(bytes([band]) + rows, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big") >> 1)
+    return keys
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4")
+
+
+def estimate_similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """
+    Estimated Jaccard similarity of the two word sets.
+    """
+    return float(np.count_nonzero(left == right)) / NUM_PERMUTATIONS
+
+
+def _load_buckets(db: Session, keys: Iterable[int]) -> Dict[int, List[int]]:
+    """
+    Ticket ids in each bucket, at most SIMILARITY_BUCKET_CANDIDATES per bucket (the
+    newest), so a bucket shared by thousands of near-identical queries stays cheap.
+
+    Each bucket is read with its own ORDER BY ticket_id DESC LIMIT over the
+    (bucket, ticket_id) primary key, so the database stops after the limit instead
+    of ranking the whole bucket; the per-bucket selects are sent UNION ALL in chunks.
+    """
+    keys = sorted(set(keys))
+    by_bucket: Dict[int, List[int]] = {}
+    for start in range(0, len(keys), BUCKETS_PER_QUERY):
+        per_bucket = [
+            select(TicketLshBucket.bucket, TicketLshBucket.ticket_id)
+            .where(TicketLshBucket.bucket == key)
+            .order_by(TicketLshBucket.ticket_id.desc())
+            .limit(settings.SIMILARITY_BUCKET_CANDIDATES)
+            .subquery()
+            .select()
+            for key in keys[start:start + BUCKETS_PER_QUERY]
+        ]
+        for bucket, ticket_id in db.execute(union_all(*per_bucket)):
+            by_bucket.setdefault(bucket, []).append(ticket_id)
+    return by_bucket
+
+
+def _load_signatures(db: Session, ticket_ids: Set[int]) -> Dict[int, np.ndarray]:
+    if not ticket_ids:
+        return {}
+    rows = db.query(TicketSignature).filter(TicketSignature.ticket_id.in_(ticket_ids))
+    return {row.ticket_id: signature_from_bytes(row.signature) for row in rows}
+
+
+def _best_matches(
+    signature: np.ndarray,
+    candidates: Set[int],
+    signatures: Dict[int, np.ndarray],
+    threshold: float,
+) -> List[Tuple[int, float]]:
+    scored = [
+        (ticket_id, estimate_similarity(signature, signatures[ticket_id]))
+        for ticket_id in candidates if ticket_id in signatures
+    ]
+    # Most similar first; on ties the oldest ticket wins
+    return sorted(
+        [(ticket_id, score) for ticket_id, score in scored if score >= threshold],
+        key=lambda match: (-match[1], match[0]),
+    )
+
+
+def match_new_tickets(db: Session, signatures: Dict[int, np.ndarray]) -> Dict[int, int]:
+    """
+    For each new, not yet indexed ticket, the most similar indexed ticket scoring at
+    least SIMILARITY_THRESHOLD. Tickets earlier in `signatures` are candidates too.
+
+    Candidates for all tickets are found with one bucket query and one signature
+    query, so the cost does not depend on how many tickets are already indexed.
+    """
+    keys = {ticket_id: band_keys(signature) for ticket_id, signature in signatures.items()}
+    if not keys:
+        return {}
+
+    by_bucket = _load_buckets(db, (key for ticket_keys in keys.values() for key in ticket_keys))
+    known = _load_signatures(db, {ticket_id for ticket_ids in by_bucket.values() for ticket_id in ticket_ids})
+
+    duplicates = {}
+    for ticket_id, signature in signatures.items():
+        candidates = {candidate for key in keys[ticket_id] for candidate in by_bucket.get(key, ())}
+        candidates.discard(ticket_id)
+        matches = _best_matches(signature, candidates, known, settings.SIMILARITY_THRESHOLD)
+        if matches:
+            duplicates[ticket_id] = matches[0][0]
+        known[ticket_id] = signature
+        for key in keys[ticket_id]:
+            by_bucket.setdefault(key, []).append(ticket_id)
+    return duplicates
+
+
+def index_tickets(db: Session, tickets: List[Ticket]) -> None:
+    """
+    Add newly flushed tickets to the LSH index and link each one to its most similar
+    earlier ticket through `duplicate_of`. Does NOT commit.
+    """
+    signatures = {ticket.id: minhash_signature(ticket.source_query) for ticket in tickets}
+    signatures = {ticket_id: signature for ticket_id, signature in signatures.items() if signature is not None}
+    duplicates = match_new_tickets(db, signatures)
+
+    for ticket in tickets:
+        if ticket.id not in signatures:
+            continue
+        signature = signatures[ticket.id]
+        if ticket.id in duplicates:
+            ticket.duplicate_of = duplicates[ticket.id]
+        db.add(TicketSignature(ticket_id=ticket.id, signature=signature.tobytes()))
+        db.add_all([TicketLshBucket(bucket=key, ticket_id=ticket.id) for key in band_keys(signature)])
+
+
+def find_similar(db: Session, ticket_id: int, threshold: float) -> List[Tuple[int, float]]:
+    """
+    Indexed tickets whose estimated similarity to the given ticket is at least
+    `threshold`, most similar first.
+    """
+    row = db.query(TicketSignature).filter(TicketSignature.ticket_id == ticket_id).first()
+    if row is None:
+        return []
+    signature = signature_from_bytes(row.signature)
+    by_bucket = _load_buckets(db, band_keys(signature))
+    candidates = {candidate for ticket_ids in by_bucket.values() for candidate in ticket_ids}
+    candidates.discard(ticket_id)
+    return _best_matches(signature, candidates, _load_signatures(db, candidates), threshold)
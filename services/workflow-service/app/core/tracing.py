@@ -0,0 +1,305 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+
+# W3C trace context: version-trace_id-parent_id-flags
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+MAX_STATEMENT_LENGTH = 500
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    def __init__(self, trace_id: str, request_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.sampled = sampled
+        # Appended from request, threadpool and shard worker threads; list.append is atomic
+        self.spans: List["Span"] = []
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attributes", "error", "start", "duration_ms", "_started")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start = time.time()
+        self.duration_ms: Optional[float] = None
+        self._started = time.perf_counter()
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.duration_ms is not None:
+            return
+        if error is not None:
+            self.error = type(error).__name__
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        self.trace.spans.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "request_id": self.trace.request_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start, tz=timezone.utc).isoformat(),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+# Exporters
+
+class JsonlExporter:
+    """
+    Appends one JSON line per span to a local file.
+
+    export() only queues the spans; a background thread does the encoding and the
+    file I/O, so requests never wait on the disk.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._writer.start()
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        self._queue.put(spans)
+
+    def flush(self) -> None:
+        """
+        Block until every span exported so far is written.
+        """
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer.join()
+
+    def _run(self) -> None:
+        while True:
+            spans = self._queue.get()
+            try:
+                if spans is None:
+                    return
+                lines = "".join(json.dumps(span, default=str) + "\n" for span in spans)
+                with open(self.path, "a", encoding="utf-8") as handle:
+                    handle.write(lines)
+            except Exception:
+                # Tracing must never take the service down; drop the batch
+                logger.exception("Failed to export %d spans to %s", len(spans), self.path)
+            finally:
+                self._queue.task_done()
+
+
+class InMemoryCollector:
+    """
+    Keeps exported spans in memory, for tests and local debugging.
+    """
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.spans.extend(spans)
+
+    def for_request(self, request_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [span for span in self.spans if span["request_id"] == request_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+_exporter = None
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        _exporter = InMemoryCollector() if settings.TRACE_EXPORTER == "memory" else JsonlExporter(settings.TRACE_FILE)
+    return _exporter
+
+
+def set_exporter(exporter):
+    """
+    Replace the span exporter and return the previous one.
+    """
+    global _exporter
+    previous, _exporter = _exporter, exporter
+    return previous
+
+
+# Span API
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """
+    Start a child of the current span without making it current, for event hooks
+    that end the span elsewhere. Returns None when the request is not traced.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Record a nested span around a block. A no-op when the request is not traced.
+    """
+    child = start_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    match = _TRACEPARENT.match(header.strip().lower()) if header else None
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+@contextmanager
+def trace_request(request_id: str, traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Root span of a request.
+
+    The request is sampled when the incoming traceparent says so, or else with
+    probability TRACE_SAMPLE_RATE. With TRACE_SLOW_REQUEST_MS set, every request is
+    recorded and unsampled ones are still exported when they exceed the threshold.
+    """
+    incoming = parse_traceparent(traceparent)
+    if incoming is not None:
+        trace_id, parent_id, sampled = incoming
+    else:
+        trace_id, parent_id = request_id.replace("-", ""), None
+        sampled = settings.TRACE_SAMPLE_RATE > 0 and random.random() < settings.TRACE_SAMPLE_RATE
+    if not sampled and settings.TRACE_SLOW_REQUEST_MS <= 0:
+        yield None
+        return
+
+    trace = Trace(trace_id, request_id, sampled)
+    root = Span(trace, "http.request", parent_id, attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        root.end()
+        if trace.sampled or root.duration_ms >= settings.TRACE_SLOW_REQUEST_MS:
+            get_exporter().export([recorded.to_dict() for recorded in trace.spans])
+
+
+def traceparent_for(root: Span) -> str:
+    return f"00-{root.trace.trace_id}-{root.span_id}-{'01' if root.trace.sampled else '00'}"
+
+
+class TracedJSONResponse(JSONResponse):
+    """
+    JSONResponse recording the encoding of the body as a span.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with span("response.encode"):
+            return super().render(content)
+
+
+# SQLAlchemy hooks: every statement on any engine, and each outermost session commit
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._trace_span = start_span("sql", statement=statement[:MAX_STATEMENT_LENGTH], executemany=executemany)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    sql_span = getattr(context, "_trace_span", None)
+    if sql_span is not None:
+        sql_span.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    sql_span = getattr(exception_context.execution_context, "_trace_span", None)
+    if sql_span is not None:
+        sql_span.end(exception_context.original_exception)
+
+
+def _end_commit_span(session, error: Optional[str] = None) -> None:
+    pending = session.info.pop("trace_commit_span", None)
+    if pending is None:
+        return
+    commit_span, token = pending
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Ended from a different context than it started in; nothing to restore
+        pass
+    commit_span.error = error
+    commit_span.end()
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    if not session.in_nested_transaction():
+        commit_span = start_span("db.commit")
+        if commit_span is not None:
+            # Current until the commit ends, so the statements flushed by it nest under it
+            session.info["trace_commit_span"] = (commit_span, _current_span.set(commit_span))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if not session.in_nested_transaction():
+        _end_commit_span(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    # A commit that failed part-way is rolled back without after_commit
+    if not session.in_nested_transaction():
+        _end_commit_span(session, error="rollback")
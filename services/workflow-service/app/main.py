@@ -8,19 +8,27 @@ from app.api.tickets import router as tickets_router
 from app.api.escalate import router as escalate_router
 from app.api.resolve import router as resolve_router
 from app.api.audit import router as audit_router
+from app.api.analytics import router as analytics_router
 from app.core.db import SessionLocal, get_db
+from app.core.sharding import scatter_gather
+from app.core.tracing import TRACEPARENT_HEADER, TracedJSONResponse, trace_request, traceparent_for
 
 app = FastAPI(
     title="JNPI Core Ticketing API",
     description="Sync, stateful, transactional backbone of the JNPI HITL lifecycle.",
     version="1.0.0",
+    default_response_class=TracedJSONResponse,
 )
 
 @app.middleware("http")
 async def add_correlation_id(request: Request, call_next):
     request_id = str(uuid.uuid4())
     request.state.request_id = request_id
-    response = await call_next(request)
+    with trace_request(request_id, request.headers.get(TRACEPARENT_HEADER), method=request.method, path=request.url.path) as root:
+        response = await call_next(request)
+        if root is not None:
+            root.attributes["status_code"] = response.status_code
+            response.headers[TRACEPARENT_HEADER] = traceparent_for(root)
     response.headers["X-Request-ID"] = request_id
     return response
 
@@ -41,7 +49,7 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.get("/health", tags=["system"])
 def health_check(db: Session = Depends(get_db)):
     try:
-        db.execute(text("SELECT 1"))
+        scatter_gather(db, lambda session: session.execute(text("SELECT 1")))
         db_status = "ok"
     except Exception:
         db_status = "error"
@@ -51,4 +59,5 @@ app.include_router(tickets_router)
 app.include_router(escalate_router)
 app.include_router(resolve_router)
 app.include_router(audit_router)
+app.include_router(analytics_router)
 
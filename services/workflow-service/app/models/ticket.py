@@ -1,11 +1,15 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, BigInteger, Integer, String, Float, Date, DateTime, ForeignKey, Text, JSON, Index, LargeBinary
+from sqlalchemy.orm import relationship
 from app.core.db import Base
 
+# Ticket ids are 64-bit so sharded deployments can mint them per shard; SQLite keeps INTEGER for rowid autoincrement
+TicketId = BigInteger().with_variant(Integer, "sqlite")
+
 class Ticket(Base):
     __tablename__ = "tickets"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(TicketId, primary_key=True, index=True)
     source_query = Column(Text, nullable=False)
     agent_decision = Column(String(255), nullable=True)
     confidence_score = Column(Float, nullable=True)
@@ -22,18 +26,100 @@ class Ticket(Base):
     # history_log stored as structured JSON array
     history_log = Column(JSON, nullable=False, default=list)
 
+    # entry_hash of the latest AuditLog row for this ticket (head of its hash chain)
+    audit_hash = Column(String(64), nullable=True)
+
+    # Most similar earlier ticket found by the LSH index at creation. Not a foreign key,
+    # since with sharding the matched ticket may live on another shard.
+    duplicate_of = Column(TicketId, nullable=True, index=True)
+
 class AuditLog(Base):
     """
     Immutable structured audit records representing mutations in the system.
     """
     __tablename__ = "audit_logs"
+    # Serves per-ticket history pages newest first
+    __table_args__ = (Index("ix_audit_logs_ticket_id_id", "ticket_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
+    ticket_id = Column(TicketId, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
     actor = Column(String(255), nullable=False)
     action = Column(String(100), nullable=False)
     previous_state = Column(String(50), nullable=True)
     new_state = Column(String(50), nullable=False)
     reason = Column(Text, nullable=True)
     metadata_info = Column(JSON, nullable=True)
+    # Ticket fields set by this event (e.g. assigned_to, resolution), used for point-in-time replay
+    changes = Column(JSON, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+
+    # Per-ticket hash chain: entry_hash covers this row's content and prev_hash
+    prev_hash = Column(String(64), nullable=True)
+    entry_hash = Column(String(64), nullable=True)
+
+class TicketSnapshot(Base):
+    """
+    Compact copy of a ticket's mutable state taken every N events, so point-in-time
+    reconstruction only replays the audit entries recorded after it.
+    """
+    __tablename__ = "ticket_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticket_id = Column(TicketId, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
+    audit_log_id = Column(Integer, ForeignKey("audit_logs.id", ondelete="CASCADE"), nullable=False)
+    event_count = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False, index=True)
+    state = Column(JSON, nullable=False)
+
+    audit_log = relationship(AuditLog)
+
+class AuditCheckpoint(Base):
+    """
+    Watermark of an audit chain verification, used to resume incrementally, with the
+    failures found up to it so later runs keep reporting them.
+    """
+    __tablename__ = "audit_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    last_audit_id = Column(Integer, nullable=False)
+    rows_verified = Column(Integer, nullable=False, default=0)
+    verified_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    failures = Column(JSON, nullable=True)
+
+class LifecycleRollup(Base):
+    """
+    Cached per-day lifecycle analytics (time-in-state histograms and reviewer decisions).
+    Only completed days are stored, so cached rows never need invalidation.
+    """
+    __tablename__ = "lifecycle_rollups"
+
+    day = Column(Date, primary_key=True)
+    payload = Column(JSON, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class IdBlock(Base):
+    """
+    Per-database counter of reserved ticket id blocks, used when tickets are sharded.
+    """
+    __tablename__ = "id_blocks"
+
+    name = Column(String(50), primary_key=True)
+    next_block = Column(BigInteger, nullable=False, default=0)
+
+class TicketSignature(Base):
+    """
+    MinHash signature of a ticket's normalized source_query.
+    """
+    __tablename__ = "ticket_signatures"
+
+    ticket_id = Column(TicketId, ForeignKey("tickets.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+
+class TicketLshBucket(Base):
+    """
+    LSH band buckets of ticket signatures; tickets sharing a bucket are near-duplicate candidates.
+    """
+    __tablename__ = "ticket_lsh_buckets"
+
+    bucket = Column(BigInteger, primary_key=True)
+    ticket_id = Column(TicketId, ForeignKey("tickets.id", ondelete="CASCADE"), primary_key=True)
@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict
+from datetime import date
+
+class StateDurationStats(BaseModel):
+    count: int = Field(..., description="Number of completed stays in this state.")
+    mean_seconds: float
+    median_seconds: float
+    p95_seconds: float
+
+class ReviewerStats(BaseModel):
+    resolved: int
+    rejected: int
+    total: int
+    resolution_rate: float = Field(..., description="Share of the reviewer's decisions that were RESOLVED.")
+    rejection_ratio: float = Field(..., description="Share of the reviewer's decisions that were REJECTED.")
+
+class DailyThroughput(BaseModel):
+    day: date
+    resolved: int
+    rejected: int
+
+class LifecycleReport(BaseModel):
+    date_start: date
+    date_end: date
+    time_in_state: Dict[str, StateDurationStats] = Field(..., description="Time spent in each FSM state, keyed by state.")
+    reviewers: Dict[str, ReviewerStats] = Field(..., description="Decision counts and rates keyed by reviewer.")
+    resolved: int
+    rejected: int
+    rejection_ratio: Optional[float] = None
+    throughput: List[DailyThroughput] = []
+    days_computed: int = Field(..., description="Days recomputed for this report; the rest came from cached rollups.")
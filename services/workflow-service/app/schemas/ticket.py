@@ -22,9 +22,35 @@ class AuditLogResponse(BaseModel):
     reason: Optional[str] = Field(None, description="The rationale or reason for the state change.")
     metadata_info: Optional[Dict[str, Any]] = Field(None, description="Extra metadata.")
     timestamp: datetime
+    prev_hash: Optional[str] = Field(None, description="Hash of the previous audit entry of the same ticket.")
+    entry_hash: Optional[str] = Field(None, description="Hash chaining this entry to prev_hash.")
 
     model_config = ConfigDict(from_attributes=True)
 
+class AuditChainFailure(BaseModel):
+    audit_id: Optional[int] = Field(None, description="Last audit entry verified for the ticket; null when none is left.")
+    ticket_id: int
+    error: str
+    shard: Optional[int] = Field(None, description="Shard holding the entry when tickets are sharded.")
+
+class AuditShardVerification(BaseModel):
+    shard: int
+    resumed_from: int
+    last_audit_id: int
+    checkpoint: int
+    rows_verified: int
+    valid: bool
+
+class AuditVerificationResponse(BaseModel):
+    valid: bool = Field(..., description="True when every verified entry matches its hash chain.")
+    full: bool = Field(..., description="Whether verification started from the beginning of the log.")
+    resumed_from: Optional[int] = Field(None, description="Audit id of the checkpoint verification resumed after (per shard when sharded).")
+    last_audit_id: Optional[int] = Field(None, description="Last audit id examined (per shard when sharded).")
+    checkpoint: Optional[int] = Field(None, description="Audit id of the latest stored checkpoint after this run (per shard when sharded).")
+    rows_verified: int
+    failures: List[AuditChainFailure] = []
+    shards: List[AuditShardVerification] = Field([], description="Per-shard results when tickets are sharded.")
+
 
 class TicketBase(BaseModel):
     source_query: str = Field(..., description="The original user query.")
@@ -53,9 +79,56 @@ class TicketResponse(TicketBase):
     created_at: datetime
     updated_at: datetime
     history_log: List[Dict[str, Any]] = []
+    history_count: Optional[int] = Field(None, description="Total number of history entries when history_log holds only the most recent ones.")
+    duplicate_of: Optional[int] = Field(None, description="The most similar earlier ticket, if this one looks like a rephrasing of it.")
+
+    model_config = ConfigDict(from_attributes=True)
+
+class SimilarTicket(BaseModel):
+    id: int
+    source_query: str
+    status: TicketStateEnum
+    created_at: datetime
+    duplicate_of: Optional[int] = None
+    similarity: float = Field(..., description="Estimated overlap of the two queries' normalized words, from 0 to 1.")
 
     model_config = ConfigDict(from_attributes=True)
 
+class TicketHistoryPage(BaseModel):
+    items: List[AuditLogResponse] = Field(..., description="History entries, newest first.")
+    next_cursor: Optional[int] = Field(None, description="Pass as `cursor` to fetch the next (older) page; null on the last page.")
+
+
+MAX_LOOKUP_IDS = 500
+
+class TicketLookupRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_LOOKUP_IDS, description="Ticket IDs to fetch, in the desired response order.")
+    fields: Optional[List[str]] = Field(None, description="Ticket fields to return; id is always included. Defaults to all fields.")
+
+class TicketLookupResponse(BaseModel):
+    tickets: List[Dict[str, Any]] = Field(..., description="Found tickets, in request order.")
+    missing: List[int] = Field(..., description="Requested IDs that do not exist.")
+
+
+class IngestStatusEnum(str, Enum):
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    INVALID = "invalid"
+    FAILED = "failed"
+
+class IngestAck(BaseModel):
+    index: int = Field(..., description="Position of the record in the ingested stream, starting at 0.")
+    status: IngestStatusEnum
+    id: Optional[int] = Field(None, description="ID of the created ticket, or of the existing ticket for duplicates.")
+    error: Optional[str] = Field(None, description="Why the record was not stored.")
+
+class IngestResponse(BaseModel):
+    received: int
+    created: int
+    duplicates: int
+    rejected: int = Field(..., description="Records acked as invalid or failed.")
+    acks: List[IngestAck] = Field(..., description="One acknowledgement per record, in stream order.")
+
 
 class EscalationRequest(BaseModel):
     ticket_id: int = Field(..., description="The ID of the ticket to escalate.")
@@ -1,9 +1,22 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
 import pytest
+import msgpack
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.core.db import Base, get_db
+from app.models.ticket import AuditLog, TicketSnapshot
+from app.core.config import settings
+from app.core.batching import GroupCommitter, get_group_committer
+from app.core.ingest import iter_frames
+from fastapi import HTTPException
+from app.api.escalate import apply_escalation
+from app.api.tickets import apply_update
+from app.core.audit import verify_audit_chain
+from app.models.ticket import Ticket
+from app.schemas.ticket import EscalationRequest, TicketUpdate
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_api.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
@@ -142,3 +155,334 @@ def test_audit_logs():
     assert len(audits) == 2
     assert audits[0]["action"] == "triage" # Orders descending
     assert audits[1]["action"] == "CREATE"
+
+def test_audit_verify(monkeypatch):
+    create_response = client.post("/tickets", json={"source_query": "Verify me", "escalation_reason": "Testing verification"})
+    ticket_id = create_response.json()["id"]
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "auditor", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+    client.patch(f"/tickets/{ticket_id}", json={"assigned_to": "auditor"})
+
+    audits = client.get(f"/audit?ticket_id={ticket_id}").json()
+    assert audits[1]["prev_hash"] == audits[2]["entry_hash"]
+    assert audits[0]["prev_hash"] == audits[1]["entry_hash"]
+
+    # Rows younger than the lag are verified but not checkpointed
+    assert client.get("/audit/verify").json()["checkpoint"] == 0
+    assert client.get("/audit/verify").json()["rows_verified"] == 3
+
+    monkeypatch.setattr(settings, "AUDIT_CHECKPOINT_LAG_SECONDS", 0)
+    verify_res = client.get("/audit/verify")
+    assert verify_res.status_code == 200
+    report = verify_res.json()
+    assert report["valid"] is True
+    assert report["rows_verified"] == 3
+
+    # Incremental run resumes from the stored checkpoint
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "auditor", "action": "review", "new_state": "IN_REVIEW", "reason": "Reviewing"})
+    report = client.get("/audit/verify").json()
+    assert report["valid"] is True
+    assert report["resumed_from"] == audits[0]["id"]
+    assert report["rows_verified"] == 1
+
+    # Tampering with an already verified row is caught by a full verification
+    db = TestingSessionLocal()
+    db.query(AuditLog).filter(AuditLog.id == audits[1]["id"]).update({"reason": "Rewritten"})
+    db.commit()
+    db.close()
+
+    report = client.get("/audit/verify?full=true").json()
+    assert report["valid"] is False
+    assert report["failures"][0]["audit_id"] == audits[1]["id"]
+    assert report["failures"][0]["error"] == "Entry hash mismatch"
+
+    # The checkpoint still advances; the known failure is carried to incremental runs
+    client.post("/tickets", json={"source_query": "Verify me too", "escalation_reason": "Testing verification"}).json()["id"]
+    report = client.get("/audit/verify").json()
+    # The full run checkpointed the IN_REVIEW row, the one after the PATCH entry
+    assert report["resumed_from"] == audits[0]["id"] + 1
+    assert report["rows_verified"] == 1
+    assert [(failure["audit_id"], failure["error"]) for failure in report["failures"]] == [(audits[1]["id"], "Entry hash mismatch")]
+
+    # Deleting the tail of a chain leaves the ticket's stored head dangling
+    db = TestingSessionLocal()
+    db.query(AuditLog).filter(AuditLog.reason == "Rewritten").update({"reason": "Claim"})
+    db.query(AuditLog).filter(AuditLog.ticket_id == ticket_id, AuditLog.new_state == "IN_REVIEW").delete()
+    db.commit()
+    db.close()
+
+    report = client.get("/audit/verify?full=true").json()
+    assert report["valid"] is False
+    assert report["failures"] == [{"audit_id": audits[0]["id"], "ticket_id": ticket_id, "error": "Chain head mismatch", "shard": None}]
+
+def test_concurrent_writers_do_not_fork_audit_chain():
+    ticket_id = client.post("/tickets", json={"source_query": "Race me", "escalation_reason": "Testing concurrent writers"}).json()["id"]
+    escalation = EscalationRequest(ticket_id=ticket_id, actor="r1", action="assign", new_state="ASSIGNED", reason="Claim")
+
+    # The second writer read the ticket before the first one committed (SQLite has no row locks)
+    first, second = TestingSessionLocal(), TestingSessionLocal()
+    # Holding a reference keeps the stale instance in second's identity map
+    stale = second.query(Ticket).filter(Ticket.id == ticket_id).one()
+    apply_update(first, ticket_id, TicketUpdate(assigned_to="r1"))
+    first.commit()
+    with pytest.raises(HTTPException) as conflict:
+        apply_escalation(second, escalation)
+    assert conflict.value.status_code == 409
+    second.rollback()
+    first.close()
+    second.close()
+
+    assert client.post("/escalate", json=escalation.model_dump()).status_code == 200
+    db = TestingSessionLocal()
+    assert verify_audit_chain(db, full=True)["valid"] is True
+    db.close()
+
+def test_get_ticket_as_of(monkeypatch):
+    monkeypatch.setattr(settings, "SNAPSHOT_INTERVAL", 2)
+    ticket = client.post("/tickets", json={"source_query": "Time travel", "escalation_reason": "Testing as_of"}).json()
+    ticket_id = ticket["id"]
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+    client.patch(f"/tickets/{ticket_id}", json={"assigned_to": "r1"})
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "review", "new_state": "IN_REVIEW", "reason": "Reviewing"})
+    client.post("/resolve", json={"ticket_id": ticket_id, "actor": "r1", "final_decision": "Allowed.", "resolution_status": "RESOLVED", "reason": "Checked."})
+
+    db = TestingSessionLocal()
+    assert db.query(TicketSnapshot).filter(TicketSnapshot.ticket_id == ticket_id).count() == 2
+    db.close()
+
+    history = client.get(f"/tickets/{ticket_id}").json()["history_log"]
+    timestamps = [entry["timestamp"] for entry in history]
+
+    # Before the first snapshot: replayed from the creation entry
+    past = client.get(f"/tickets/{ticket_id}", params={"as_of": timestamps[1]}).json()
+    assert past["status"] == "ASSIGNED"
+    assert past["assigned_to"] is None
+    assert len(past["history_log"]) == 2
+
+    # After a snapshot: snapshot plus replayed suffix
+    past = client.get(f"/tickets/{ticket_id}", params={"as_of": timestamps[2]}).json()
+    assert past["status"] == "ASSIGNED"
+    assert past["assigned_to"] == "r1"
+    assert past["resolution"] is None
+    assert len(past["history_log"]) == 3
+
+    current = client.get(f"/tickets/{ticket_id}", params={"as_of": timestamps[4]}).json()
+    assert current["status"] == "RESOLVED"
+    assert current["resolution"] == "Allowed."
+    assert current["resolved_by"] == "r1"
+
+    before_creation = client.get(f"/tickets/{ticket_id}", params={"as_of": "2000-01-01T00:00:00"})
+    assert before_creation.status_code == 404
+
+    listing = client.get("/tickets", params={"as_of": timestamps[3]}).json()
+    assert [t["status"] for t in listing if t["id"] == ticket_id] == ["IN_REVIEW"]
+    in_review = client.get("/tickets", params={"as_of": timestamps[3], "status": "IN_REVIEW"}).json()
+    assert [t["id"] for t in in_review] == [ticket_id]
+    assert client.get("/tickets", params={"as_of": timestamps[3], "status": "RESOLVED"}).json() == []
+    assert [t["id"] for t in client.get("/tickets", params={"as_of": timestamps[2], "assigned_to": "r1"}).json()] == [ticket_id]
+    assert client.get("/tickets", params={"as_of": timestamps[1], "assigned_to": "r1"}).json() == []
+
+    # Timezone-aware as_of values are compared in UTC
+    in_review_at = datetime.fromisoformat(timestamps[3]).replace(tzinfo=timezone.utc)
+    for as_of in (in_review_at.isoformat().replace("+00:00", "Z"), in_review_at.astimezone(timezone(timedelta(hours=2))).isoformat()):
+        response = client.get(f"/tickets/{ticket_id}", params={"as_of": as_of})
+        assert response.status_code == 200 and response.json()["status"] == "IN_REVIEW"
+        assert [t["status"] for t in client.get("/tickets", params={"as_of": as_of}).json() if t["id"] == ticket_id] == ["IN_REVIEW"]
+
+def test_get_ticket_as_of_with_legacy_audit_entries():
+    ticket_id = client.post("/tickets", json={"source_query": "Legacy history", "escalation_reason": "Testing as_of"}).json()["id"]
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+    client.patch(f"/tickets/{ticket_id}", json={"assigned_to": "r1"})
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "review", "new_state": "IN_REVIEW", "reason": "Reviewing"})
+    client.post("/resolve", json={"ticket_id": ticket_id, "actor": "r1", "final_decision": "Allowed.", "resolution_status": "RESOLVED", "reason": "Checked."})
+
+    # Entries written before field changes were recorded
+    db = TestingSessionLocal()
+    db.query(AuditLog).filter(AuditLog.ticket_id == ticket_id).update({"changes": None})
+    db.commit()
+    db.close()
+
+    history = client.get(f"/tickets/{ticket_id}").json()["history_log"]
+    current = client.get(f"/tickets/{ticket_id}", params={"as_of": history[-1]["timestamp"]}).json()
+    assert (current["status"], current["assigned_to"], current["resolution"], current["resolved_by"]) == ("RESOLVED", "r1", "Allowed.", "r1")
+
+    # Before the ticket last changed only assigned_to falls back, as an approximation
+    past = client.get(f"/tickets/{ticket_id}", params={"as_of": history[3]["timestamp"]}).json()
+    assert (past["status"], past["assigned_to"], past["resolution"]) == ("IN_REVIEW", "r1", None)
+
+def test_lifecycle_analytics():
+    ticket_id = client.post("/tickets", json={"source_query": "Measure me", "escalation_reason": "Testing analytics"}).json()["id"]
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "review", "new_state": "IN_REVIEW", "reason": "Reviewing"})
+    client.post("/resolve", json={"ticket_id": ticket_id, "actor": "r1", "final_decision": "No.", "resolution_status": "REJECTED", "reason": "Out of policy."})
+
+    response = client.get("/analytics/lifecycle")
+    assert response.status_code == 200
+    report = response.json()
+    assert report["rejected"] == 1
+    assert report["reviewers"]["r1"]["rejection_ratio"] == 1.0
+    assert set(report["time_in_state"]) == {"CREATED", "ASSIGNED", "IN_REVIEW"}
+
+    assert client.get("/analytics/lifecycle", params={"date_start": "2026-02-01", "date_end": "2026-01-01"}).status_code == 400
+
+def test_lookup_tickets():
+    first = client.post("/tickets", json={"source_query": "Lookup one", "escalation_reason": "Testing lookup"}).json()["id"]
+    second = client.post("/tickets", json={"source_query": "Lookup two", "escalation_reason": "Testing lookup"}).json()["id"]
+
+    response = client.post("/tickets/lookup", json={"ids": [second, 9999, first, second]})
+    assert response.status_code == 200
+    data = response.json()
+    assert [t["id"] for t in data["tickets"]] == [second, first]
+    assert data["tickets"][1]["source_query"] == "Lookup one"
+    assert data["missing"] == [9999]
+
+    projected = client.post("/tickets/lookup", json={"ids": [first], "fields": ["status"]}).json()
+    assert projected["tickets"] == [{"id": first, "status": "CREATED"}]
+
+    assert client.post("/tickets/lookup", json={"ids": [first], "fields": ["password"]}).status_code == 400
+    assert client.post("/tickets/lookup", json={"ids": list(range(501))}).status_code == 422
+
+def test_list_tickets_projection():
+    client.post("/tickets", json={"source_query": "Project me", "escalation_reason": "Testing projection"})
+    response = client.get("/tickets", params={"fields": "status,source_query"})
+    assert response.status_code == 200
+    assert response.json() == [{"id": response.json()[0]["id"], "status": "CREATED", "source_query": "Project me"}]
+
+def test_ticket_history_pages_and_bounded_embed():
+    ticket_id = client.post("/tickets", json={"source_query": "Bounce me", "escalation_reason": "Testing history"}).json()["id"]
+    for _ in range(6):
+        client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+        client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "unassign", "new_state": "CREATED", "reason": "Release"})
+
+    ticket = client.get(f"/tickets/{ticket_id}", params={"history_limit": 5}).json()
+    assert ticket["history_count"] == 13
+    assert len(ticket["history_log"]) == 5
+    assert ticket["history_log"][-1]["action"] == "unassign"
+    assert client.get(f"/tickets/{ticket_id}", params={"history_limit": 0}).json()["history_log"] == []
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 5}
+        if cursor is not None:
+            params["cursor"] = cursor
+        page = client.get(f"/tickets/{ticket_id}/history", params=params).json()
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 13
+    assert [entry["id"] for entry in seen] == sorted((entry["id"] for entry in seen), reverse=True)
+    assert seen[-1]["action"] == "CREATE"
+
+    assert client.get("/tickets/9999/history").status_code == 404
+
+def test_write_and_lookup_responses_embed_bounded_history(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_EMBED_LIMIT", 2)
+    ticket_id = client.post("/tickets", json={"source_query": "Bound my writes", "escalation_reason": "Testing history"}).json()["id"]
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+
+    escalated = client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "review", "new_state": "IN_REVIEW", "reason": "Reviewing"}).json()
+    assert (escalated["history_count"], [entry["action"] for entry in escalated["history_log"]]) == (3, ["assign", "review"])
+
+    patched = client.patch(f"/tickets/{ticket_id}", json={"assigned_to": "r2"}).json()
+    assert (patched["history_count"], len(patched["history_log"])) == (4, 2)
+
+    resolved = client.post("/resolve", json={"ticket_id": ticket_id, "actor": "r2", "final_decision": "Fine", "resolution_status": "RESOLVED", "reason": "Checked"}).json()
+    assert (resolved["history_count"], resolved["history_log"][-1]["action"]) == (5, "resolve")
+
+    [looked_up] = client.post("/tickets/lookup", json={"ids": [ticket_id]}).json()["tickets"]
+    assert (looked_up["history_count"], len(looked_up["history_log"])) == (5, 2)
+    projected = client.post("/tickets/lookup", json={"ids": [ticket_id], "fields": ["history_log"]}).json()["tickets"]
+    assert [entry["action"] for entry in projected[0]["history_log"]] == ["UPDATE_ASSIGNMENT", "resolve"]
+
+def test_transitions_through_group_commit():
+    committer = GroupCommitter(TestingSessionLocal, window_ms=5)
+    app.dependency_overrides[get_group_committer] = lambda: committer
+    try:
+        ticket_id = client.post("/tickets", json={"source_query": "Batch me", "escalation_reason": "Testing group commit"}).json()["id"]
+        response = client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+        assert response.status_code == 200
+        assert response.json()["status"] == "ASSIGNED"
+
+        assert client.patch(f"/tickets/{ticket_id}", json={"assigned_to": "r1"}).json()["assigned_to"] == "r1"
+        assert client.post("/resolve", json={"ticket_id": ticket_id, "actor": "r1", "final_decision": "x", "resolution_status": "RESOLVED", "reason": "y"}).status_code == 409
+        assert client.post("/escalate", json={"ticket_id": 9999, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"}).status_code == 404
+    finally:
+        del app.dependency_overrides[get_group_committer]
+        committer.close()
+
+    assert client.get(f"/tickets/{ticket_id}").json()["history_count"] == 3
+
+def frame(payload: bytes) -> bytes:
+    return len(payload).to_bytes(4, "big") + payload
+
+def test_ingest_msgpack_stream(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_BATCH_SIZE", 2)
+    existing_id = client.post("/tickets", json={"source_query": "Already here", "escalation_reason": "r"}).json()["id"]
+
+    records = [
+        {"source_query": "Bulk 1", "escalation_reason": "r", "confidence_score": 0.4},
+        {"source_query": "Already here", "escalation_reason": "r"},
+        {"source_query": "Bulk 2"},
+        {"source_query": "Bulk 1", "escalation_reason": "r"},
+    ]
+    body = b"".join(frame(msgpack.packb(record)) for record in records) + frame(b"\xc1") + frame(msgpack.packb([1]))
+    response = client.post("/tickets/ingest", content=body + b"\x00\x00\x01", headers={"Content-Type": "application/msgpack"})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["received"], data["created"], data["duplicates"], data["rejected"]) == (7, 1, 2, 4)
+
+    acks = data["acks"]
+    assert [ack["status"] for ack in acks] == ["created", "duplicate", "invalid", "duplicate", "invalid", "invalid", "invalid"]
+    assert acks[1]["id"] == existing_id and acks[3]["id"] == acks[0]["id"]
+    assert "escalation_reason" in acks[2]["error"]
+    assert acks[6]["error"] == "Stream ended inside a frame"
+
+    ticket = client.get(f"/tickets/{acks[0]['id']}").json()
+    assert ticket["confidence_score"] == 0.4
+    assert [entry["action"] for entry in ticket["history_log"]] == ["CREATE"]
+
+    assert client.post("/tickets/ingest", json=records[0]).status_code == 415
+
+def test_iter_frames_across_chunks():
+    async def chunks():
+        data = frame(b"ab") + (10).to_bytes(4, "big") + b"x" * 10 + frame(b"c")
+        for i in range(0, len(data), 3):
+            yield data[i:i + 3]
+
+    async def collect():
+        return [item async for item in iter_frames(chunks(), max_frame_bytes=5)]
+
+    items = asyncio.run(collect())
+    assert items[0] == b"ab" and items[2] == b"c"
+    assert "exceeds" in str(items[1])
+
+def test_similar_tickets_linked_at_creation():
+    def create(query):
+        return client.post("/tickets", json={"source_query": query, "escalation_reason": "Low confidence"}).json()
+
+    original = create("Is installing a temporary server rack permitted in Sector 7?")
+    rephrased = create("is installing a temporary server rack in sector 7 permitted")
+    unrelated = create("What is the refund policy for cancelled conference travel?")
+
+    assert original["duplicate_of"] is None
+    assert rephrased["duplicate_of"] == original["id"]
+    assert unrelated["duplicate_of"] is None
+
+    similar = client.get(f"/tickets/{original['id']}/similar").json()
+    assert [ticket["id"] for ticket in similar] == [rephrased["id"]]
+    assert 0.5 <= similar[0]["similarity"] <= 1
+    assert similar[0]["duplicate_of"] == original["id"]
+
+    assert client.get(f"/tickets/{unrelated['id']}/similar").json() == []
+    assert client.get("/tickets/9999/similar").status_code == 404
+
+def test_similar_candidates_capped_per_bucket(monkeypatch):
+    monkeypatch.setattr(settings, "SIMILARITY_BUCKET_CANDIDATES", 2)
+    # Same words, so every ticket shares all of its LSH buckets with the others
+    ids = [
+        client.post("/tickets", json={"source_query": f"Loading dock access on weekends{suffix}", "escalation_reason": "Low confidence"}).json()["id"]
+        for suffix in ["?", "!", ".", "??"]
+    ]
+    similar = client.get(f"/tickets/{ids[0]}/similar").json()
+    assert sorted(ticket["id"] for ticket in similar) == ids[2:]
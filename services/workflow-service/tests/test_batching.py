@@ -0,0 +1,104 @@
+import threading
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+from app.core.audit import verify_audit_chain
+from app.core.batching import GroupCommitter
+from app.core.fsm import TicketStateMachine, TicketState
+from app.models.ticket import Ticket
+from tests.conftest import TestingSessionLocal, engine
+
+def _transition(ticket_id, new_state):
+    def work(session):
+        ticket = session.query(Ticket).filter(Ticket.id == ticket_id).first()
+        TicketStateMachine(session).transition(ticket=ticket, new_state=new_state, actor="r1", action="step", reason="Batched")
+        session.flush()
+        return ticket.status
+    return work
+
+def test_group_commit_coalesces_and_isolates_failures(db_session):
+    tickets = [Ticket(source_query=f"Batch {i}", escalation_reason="Testing group commit", status=TicketState.CREATED) for i in range(5)]
+    db_session.add_all(tickets)
+    db_session.commit()
+    ticket_ids = [ticket.id for ticket in tickets]
+
+    # Count the COMMITs SQLAlchemy issues (savepoint releases are not commit events).
+    # pysqlite still autocommits each item on SQLite, so this checks one commit call per
+    # batch rather than the database's own transaction count.
+    commits = []
+    listener = lambda conn: commits.append(conn)
+    event.listen(engine, "commit", listener)
+    committer = GroupCommitter(TestingSessionLocal, window_ms=200)
+    batches = []
+    commit_batch = committer._commit_batch
+    committer._commit_batch = lambda batch: (batches.append(len(batch)), commit_batch(batch))
+
+    # The last ticket attempts an invalid CREATED -> RESOLVED transition
+    targets = [TicketState.ASSIGNED] * 4 + [TicketState.RESOLVED]
+    results = [None] * 5
+    start = threading.Barrier(5)
+
+    def submit(i):
+        start.wait()
+        try:
+            results[i] = committer.submit(_transition(ticket_ids[i], targets[i]))
+        except HTTPException as exc:
+            results[i] = exc.status_code
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    committer.close()
+    event.remove(engine, "commit", listener)
+
+    assert results == [TicketState.ASSIGNED] * 4 + [409]
+    assert sum(batches) == 5 and len(batches) < 5
+    assert len(commits) == len(batches)
+
+    db_session.expire_all()
+    statuses = [db_session.query(Ticket).filter(Ticket.id == ticket_id).one().status for ticket_id in ticket_ids]
+    assert statuses == [TicketState.ASSIGNED] * 4 + [TicketState.CREATED]
+    assert verify_audit_chain(db_session)["valid"] is True
+
+def test_group_commit_keeps_per_ticket_order(db_session):
+    ticket = Ticket(source_query="Ordered", escalation_reason="Testing ordering", status=TicketState.CREATED)
+    db_session.add(ticket)
+    db_session.commit()
+
+    committer = GroupCommitter(TestingSessionLocal, window_ms=50)
+    assert committer.submit(_transition(ticket.id, TicketState.ASSIGNED)) == TicketState.ASSIGNED
+    assert committer.submit(_transition(ticket.id, TicketState.IN_REVIEW)) == TicketState.IN_REVIEW
+    with pytest.raises(HTTPException):
+        committer.submit(_transition(ticket.id, TicketState.TRIAGED))
+    committer.close()
+
+    db_session.expire_all()
+    assert db_session.query(Ticket).filter(Ticket.id == ticket.id).one().status == TicketState.IN_REVIEW
+
+def test_group_commit_survives_batch_failures(db_session):
+    ticket = Ticket(source_query="Resilient", escalation_reason="Testing worker failures", status=TicketState.CREATED)
+    db_session.add(ticket)
+    db_session.commit()
+
+    attempts = []
+    def flaky_session_factory():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return TestingSessionLocal()
+
+    committer = GroupCommitter(flaky_session_factory, window_ms=5)
+    with pytest.raises(RuntimeError, match="database unavailable"):
+        committer.submit(_transition(ticket.id, TicketState.ASSIGNED))
+    assert committer.submit(_transition(ticket.id, TicketState.ASSIGNED)) == TicketState.ASSIGNED
+
+    # A worker that died is replaced on the next submit
+    committer.close()
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    committer._worker = dead
+    assert committer.submit(_transition(ticket.id, TicketState.IN_REVIEW)) == TicketState.IN_REVIEW
+    committer.close()
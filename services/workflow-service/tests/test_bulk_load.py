@@ -0,0 +1,96 @@
+import json
+import pytest
+from sqlalchemy.orm import Session
+from app.cli import bulk_load
+from app.core.audit import verify_audit_chain
+from app.core.db import Base, create_db_engine
+from app.core.similarity import find_similar
+from app.core.fsm import TicketState
+from app.models.ticket import Ticket, AuditLog
+
+RECORDS = [
+    {"source_query": "Is a temporary server rack permitted in Sector 7?", "escalation_reason": "Low confidence", "confidence_score": 0.3, "created_at": "2025-01-02T03:04:05Z"},
+    {"source_query": "Can visitors use the rooftop terrace?", "escalation_reason": "Policy gap", "assigned_to": "r1"},
+    {"source_query": "Is a temporary server rack permitted in Sector 7?", "escalation_reason": "Repeated"},
+    {"source_query": "Missing a reason"},
+    {"source_query": "Is a temporary server rack permitted in Sector 7 today", "escalation_reason": "Rephrased"},
+    {"source_query": "Already open", "escalation_reason": "Exists in the database"},
+]
+
+@pytest.fixture
+def database(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/load.db")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        session.add(Ticket(source_query="Already open", escalation_reason="Existing", status=TicketState.CREATED))
+        session.commit()
+    yield engine, f"sqlite:///{tmp_path}/load.db"
+    engine.dispose()
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+def test_bulk_load_matches_create_ticket(database, tmp_path):
+    engine, url = database
+    source = tmp_path / "tickets.jsonl"
+    write_jsonl(source, RECORDS)
+    # Undecodable lines are counted as invalid instead of stopping the load
+    with open(source, "ab") as handle:
+        handle.write(b'{"source_query": "Truncated\n' + b'{"source_query": "Bad \xff byte", "escalation_reason": "Encoding"}\n')
+
+    bulk_load.main([str(source), "--database-url", url, "--batch-size", "2", "--drop-indexes"])
+
+    with Session(engine) as session:
+        tickets = session.query(Ticket).order_by(Ticket.id).all()
+        assert [ticket.source_query for ticket in tickets] == ["Already open", RECORDS[0]["source_query"], RECORDS[1]["source_query"], RECORDS[4]["source_query"]]
+        first = tickets[1]
+        assert first.created_at.isoformat() == "2025-01-02T03:04:05"
+        assert first.history_log == [{
+            "action": "CREATE", "actor": "system", "previous_state": None, "new_state": "CREATED",
+            "reason": "Initial escalation creation", "timestamp": "2025-01-02T03:04:05",
+        }]
+        assert session.query(AuditLog).filter(AuditLog.ticket_id == tickets[2].id).one().changes == {"assigned_to": "r1"}
+        assert verify_audit_chain(session, full=True)["valid"]
+        assert [match_id for match_id, _ in find_similar(session, first.id, 0.5)] == [tickets[3].id]
+        assert [ticket.duplicate_of for ticket in tickets[1:]] == [None, None, first.id]
+
+    checkpoint = json.loads((tmp_path / "tickets.jsonl.checkpoint").read_text())
+    assert (checkpoint["records"], checkpoint["loaded"], checkpoint["duplicates"], checkpoint["invalid"]) == (8, 3, 2, 3)
+    assert checkpoint["complete"]
+
+    # Indexes were rebuilt
+    with engine.connect() as conn:
+        assert "ix_tickets_status" in {row[1] for row in conn.exec_driver_sql("PRAGMA index_list('tickets')")}
+
+def test_bulk_load_resumes_from_checkpoint(database, tmp_path, monkeypatch):
+    engine, url = database
+    source = tmp_path / "tickets.csv"
+    source.write_text(
+        "source_query,escalation_reason,confidence_score,assigned_to\n"
+        + "".join(f"Backfilled question {i},Reason {i},0.{i},\n" for i in range(10))
+        + '"Unterminated,quote\n'
+    )
+
+    original_write = bulk_load.BulkLoader.write
+    calls = []
+    def failing_write(self, conn, rows):
+        calls.append(len(rows["tickets"]))
+        if len(calls) == 3:
+            raise RuntimeError("connection lost")
+        original_write(self, conn, rows)
+    monkeypatch.setattr(bulk_load.BulkLoader, "write", failing_write)
+
+    with pytest.raises(RuntimeError):
+        bulk_load.main([str(source), "--database-url", url, "--batch-size", "3"])
+    assert json.loads((tmp_path / "tickets.csv.checkpoint").read_text())["records"] == 6
+
+    monkeypatch.setattr(bulk_load.BulkLoader, "write", original_write)
+    bulk_load.main([str(source), "--database-url", url, "--batch-size", "3"])
+
+    with Session(engine) as session:
+        loaded = session.query(Ticket).filter(Ticket.source_query.like("Backfilled%")).all()
+        assert sorted(ticket.source_query for ticket in loaded) == sorted(f"Backfilled question {i}" for i in range(10))
+        assert {ticket.assigned_to for ticket in loaded} == {None}
+        assert session.query(AuditLog).count() == 10
+        assert verify_audit_chain(session, full=True)["valid"]
+    assert json.loads((tmp_path / "tickets.csv.checkpoint").read_text())["invalid"] == 1
@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from sqlalchemy.orm import Session
+from app.core.db import Base, get_db, create_db_engine
+from app.core.sharding import ShardRouter, shard_for_ticket
+from app.models.ticket import Ticket, AuditLog
+from app.core.fsm import TicketState
+
+def create_shards(tmp_path, count=2):
+    engines = [create_db_engine(f"sqlite:///{tmp_path}/shard_{i}.db") for i in range(count)]
+    for engine in engines:
+        Base.metadata.create_all(bind=engine)
+    return engines
+
+@contextmanager
+def serving(router):
+    SessionFactory = router.session_factory()
+
+    def override_get_db():
+        db = SessionFactory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides[get_db] = previous
+        for engine in router.engines.values():
+            engine.dispose()
+
+@pytest.fixture
+def sharded(tmp_path):
+    router = ShardRouter(create_shards(tmp_path))
+    with serving(router) as client:
+        yield router, client
+
+def test_tickets_are_routed_by_id(sharded):
+    router, client = sharded
+    ids = [
+        client.post("/tickets", json={"source_query": f"Sharded query {i}", "escalation_reason": "Testing shards"}).json()["id"]
+        for i in range(12)
+    ]
+    assert len(set(ids)) == 12
+
+    # Each ticket and its audit rows live on the shard encoded in its id, and both shards are used
+    counts = router.map(lambda session: session.query(Ticket).count())
+    assert sum(counts) == 12 and all(counts)
+    for ticket_id in ids:
+        shard = shard_for_ticket(ticket_id)
+        stored = router.map(lambda session: session.query(AuditLog).filter(AuditLog.ticket_id == ticket_id).count())
+        assert stored[shard] == 1 and sum(stored) == 1
+
+    # Idempotency still finds the existing ticket
+    again = client.post("/tickets", json={"source_query": "Sharded query 3", "escalation_reason": "Duplicate"}).json()
+    assert again["id"] == ids[3]
+
+    ticket_id = ids[5]
+    client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+    assert client.get(f"/tickets/{ticket_id}").json()["status"] == "ASSIGNED"
+
+    lookup = client.post("/tickets/lookup", json={"ids": [ids[1], ids[0], 7]}).json()
+    assert [t["id"] for t in lookup["tickets"]] == [ids[1], ids[0]]
+    assert lookup["missing"] == [7]
+
+def test_scatter_gather_merges_in_sort_order(sharded):
+    router, client = sharded
+    ids = [
+        client.post("/tickets", json={"source_query": f"Merge query {i}", "escalation_reason": "Testing merge"}).json()["id"]
+        for i in range(10)
+    ]
+
+    listed = client.get("/tickets", params={"skip": 2, "limit": 5}).json()
+    assert [t["id"] for t in listed] == sorted(ids)[2:7]
+
+    audits = client.get("/audit", params={"limit": 4}).json()
+    timestamps = [entry["timestamp"] for entry in audits]
+    assert len(audits) == 4 and timestamps == sorted(timestamps, reverse=True)
+
+    report = client.get("/audit/verify").json()
+    assert report["valid"] is True
+    assert report["rows_verified"] == 10
+    assert len(report["shards"]) == 2
+
+    assert client.get("/health").json()["database"] == "ok"
+
+def test_similar_tickets_across_shards(sharded):
+    router, client = sharded
+    base = "Can contractors access the data centre loading dock on weekends"
+    tickets = [
+        client.post("/tickets", json={"source_query": f"{base} {suffix}", "escalation_reason": "Testing shards"}).json()
+        for suffix in ["", "please", "today", "urgently", "at night", "again"]
+    ]
+    assert len({shard_for_ticket(ticket["id"]) for ticket in tickets}) == 2
+    assert all(ticket["duplicate_of"] is not None for ticket in tickets[1:])
+
+    similar = client.get(f"/tickets/{tickets[0]['id']}/similar").json()
+    assert {ticket["id"] for ticket in similar} == {ticket["id"] for ticket in tickets[1:]}
+
+def test_tickets_created_before_sharding_stay_on_first_shard(tmp_path):
+    engines = create_shards(tmp_path)
+    # The pre-existing database becomes shard 0; its sequential ids do not encode a shard
+    with Session(engines[0]) as session:
+        session.add_all([
+            Ticket(source_query=f"Legacy query {i}", escalation_reason="Before sharding", status=TicketState.CREATED)
+            for i in range(5)
+        ])
+        session.commit()
+
+    router = ShardRouter(engines, legacy_max_id=5)
+    with serving(router) as client:
+        assert client.get("/tickets/1").json()["source_query"] == "Legacy query 0"
+        response = client.post("/escalate", json={"ticket_id": 1, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+        assert response.status_code == 200
+        assert router.map(lambda session: session.query(AuditLog).filter(AuditLog.ticket_id == 1).count()) == [1, 0]
+
+        new_ids = [
+            client.post("/tickets", json={"source_query": f"Sharded query {i}", "escalation_reason": "After sharding"}).json()["id"]
+            for i in range(6)
+        ]
+        assert min(new_ids) > 5
+        # Idempotency finds open legacy tickets whatever shard their query hashes to
+        assert [
+            client.post("/tickets", json={"source_query": f"Legacy query {i}", "escalation_reason": "Again"}).json()["id"]
+            for i in range(1, 5)
+        ] == [2, 3, 4, 5]
+        assert [t["id"] for t in client.get("/tickets").json()] == [1, 2, 3, 4, 5] + sorted(new_ids)
+        assert client.get("/audit/verify", params={"full": True}).json()["valid"] is True
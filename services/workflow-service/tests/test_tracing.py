@@ -0,0 +1,85 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+import app.core.db as db_module
+from app.main import app
+from app.core.config import settings
+from app.core.db import get_db
+from app.core.tracing import InMemoryCollector, JsonlExporter, set_exporter
+from tests.conftest import TestingSessionLocal
+
+INCOMING_TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+@pytest.fixture
+def traced(db_session, monkeypatch):
+    # Use the real get_db so its span is recorded, backed by the test database
+    monkeypatch.setattr(db_module, "SessionLocal", TestingSessionLocal)
+    previous_override = app.dependency_overrides.pop(get_db, None)
+    collector = InMemoryCollector()
+    previous_exporter = set_exporter(collector)
+    yield collector, TestClient(app)
+    set_exporter(previous_exporter)
+    if previous_override is not None:
+        app.dependency_overrides[get_db] = previous_override
+
+def test_sampled_request_records_nested_spans(traced, monkeypatch):
+    collector, client = traced
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1.0)
+
+    ticket_id = client.post("/tickets", json={"source_query": "Trace me", "escalation_reason": "Testing tracing"}).json()["id"]
+    response = client.post("/escalate", json={"ticket_id": ticket_id, "actor": "r1", "action": "assign", "new_state": "ASSIGNED", "reason": "Claim"})
+    assert response.status_code == 200
+
+    spans = collector.for_request(response.headers["X-Request-ID"])
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["name"], []).append(span)
+    assert set(by_name) >= {"http.request", "get_db", "sql", "fsm.transition", "db.commit", "response.encode"}
+
+    [root] = by_name["http.request"]
+    assert root["parent_id"] is None
+    assert root["attributes"] == {"method": "POST", "path": "/escalate", "status_code": 200}
+    assert by_name["get_db"][0]["parent_id"] == root["span_id"]
+    assert by_name["fsm.transition"][0]["parent_id"] == root["span_id"]
+    assert by_name["fsm.transition"][0]["attributes"]["to_state"] == "ASSIGNED"
+    assert all(span["trace_id"] == root["trace_id"] for span in spans)
+    assert response.headers["traceparent"] == f"00-{root['trace_id']}-{root['span_id']}-01"
+
+    # The transition's INSERT/UPDATE statements are flushed inside the commit span
+    commit_id = by_name["db.commit"][0]["span_id"]
+    assert any(span["parent_id"] == commit_id and span["attributes"]["statement"].startswith("INSERT") for span in by_name["sql"])
+
+def test_sampling_honors_incoming_traceparent(traced, monkeypatch):
+    collector, client = traced
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+
+    client.get("/health")
+    assert collector.spans == []
+
+    response = client.get("/health", headers={"traceparent": f"00-{INCOMING_TRACE_ID}-00f067aa0ba902b7-01"})
+    root = [span for span in collector.for_request(response.headers["X-Request-ID"]) if span["name"] == "http.request"][0]
+    assert root["trace_id"] == INCOMING_TRACE_ID
+    assert root["parent_id"] == "00f067aa0ba902b7"
+
+    collector.clear()
+    client.get("/health", headers={"traceparent": f"00-{INCOMING_TRACE_ID}-00f067aa0ba902b7-00"})
+    assert collector.spans == []
+
+def test_slow_requests_exported_without_sampling(traced, monkeypatch, tmp_path):
+    _, client = traced
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonlExporter(str(path))
+    set_exporter(exporter)
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(settings, "TRACE_SLOW_REQUEST_MS", 1e9)
+
+    client.get("/health")
+    exporter.flush()
+    assert not path.exists()
+
+    monkeypatch.setattr(settings, "TRACE_SLOW_REQUEST_MS", 1e-6)
+    response = client.get("/health")
+    exporter.close()
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert {span["request_id"] for span in spans} == {response.headers["X-Request-ID"]}
+    assert "traceparent" in response.headers and response.headers["traceparent"].endswith("-00")